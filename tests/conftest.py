@@ -37,3 +37,19 @@ def mocks_dir(tests_dir):
 def dom0_template(tests_dir):
     """Fixture to provide the path to status-report/tests/integration/dom0-template"""
     return os.path.join(tests_dir, "integration", "dom0-template")
+
+
+def pytest_addoption(parser):
+    """Add the --benchmarks option to run the tests marked as benchmarks"""
+    parser.addoption("--benchmarks", action="store_true",
+                     help="run the benchmarks, which assert on measured wall-clock times")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip the tests marked as benchmarks unless --benchmarks is passed"""
+    if config.getoption("--benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
@@ -79,16 +79,38 @@ def imported_bugtool(testdir, dom0_template):
 
 
 @pytest.fixture(scope="function")
-def bugtool(imported_bugtool):
+def bugtool(imported_bugtool, tmp_path_factory):
     """Test fixture for unit tests, initializes the bugtool data dict for each test"""
+    # Keep the result and plugin caches of each test in a new temporary directory:
+    imported_bugtool.CACHE_DIR = str(tmp_path_factory.mktemp("cache"))
     # Init import_bugtool.data, so each unit test function gets it pristine:
     imported_bugtool.data = {}
+    imported_bugtool.directory_specifications.clear()
+    imported_bugtool.lvm_report_cache.clear()
+    imported_bugtool.ovsdb_cache.clear()
+    imported_bugtool.stat_cache.clear()
+    imported_bugtool.stat_cache_roots.clear()
+    imported_bugtool.du_cache.clear()
+    imported_bugtool.proc_cache.clear()
+    imported_bugtool.result_cache_keys.clear()
+    imported_bugtool.plugin_cache.clear()
+    imported_bugtool.plugin_modules.clear()
     sys.argv = ["xen-bugtool", "--unlimited"]
 
     yield imported_bugtool  # provide the bugtool to the test function
 
     # Cleanup the bugtool data dict after each test as tests may modify it:
     imported_bugtool.data = {}
+    imported_bugtool.directory_specifications.clear()
+    imported_bugtool.lvm_report_cache.clear()
+    imported_bugtool.ovsdb_cache.clear()
+    imported_bugtool.stat_cache.clear()
+    imported_bugtool.stat_cache_roots.clear()
+    imported_bugtool.du_cache.clear()
+    imported_bugtool.proc_cache.clear()
+    imported_bugtool.result_cache_keys.clear()
+    imported_bugtool.plugin_cache.clear()
+    imported_bugtool.plugin_modules.clear()
     sys.argv = ["xen-bugtool", "--unlimited"]
 
 
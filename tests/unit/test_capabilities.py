@@ -0,0 +1,87 @@
+"""Test estimating the sizes and times of the requested capabilities only"""
+
+import os
+import re
+import threading
+
+
+def test_size_of_dir(bugtool, tmp_path):
+    """Assert that the files below a directory are sized, following links, matching the pattern"""
+
+    (tmp_path / "crash" / "dump").mkdir(parents=True)
+    (tmp_path / "crash" / "dump" / "dmesg.log").write_bytes(b"x" * 100)
+    (tmp_path / "crash" / "dump" / "coredump.bin").write_bytes(b"x" * 1000)
+    (tmp_path / "crash" / "top.log").write_bytes(b"x" * 10)
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "linked.log").write_bytes(b"x" * 5)
+    os.symlink(str(tmp_path / "other"), str(tmp_path / "crash" / "link"))
+    os.symlink("missing", str(tmp_path / "crash" / "dangling"))
+
+    crash = str(tmp_path / "crash")
+    assert bugtool.size_of_dir(crash) == 1115
+    assert bugtool.size_of_dir(crash, re.compile(r".*/coredump\.bin$"), True) == 115
+    assert bugtool.size_of_dir(str(tmp_path / "missing")) == 0
+    assert bugtool.size_of_all([crash + "/top.log", crash + "/dump", crash + "/missing"]) == 1110
+
+
+def test_update_capabilities(bugtool, tmp_path, mocker):
+    """Assert that only the estimators of the requested capabilities run, in parallel"""
+
+    mocker.patch.dict(bugtool.caps)
+    mocker.patch.dict(bugtool.output_limits)
+    limit = bugtool.output_limits[bugtool.CAP_XAPI_DEBUG]
+    called = []
+    barrier = threading.Barrier(2, timeout=5)
+
+    def estimate(cap):
+        called.append(cap)
+        barrier.wait()  # fails unless both estimators run at the same time
+        bugtool.update_cap_size(cap, 42)
+
+    mocker.patch.dict(bugtool.CAP_ESTIMATORS, {
+        bugtool.CAP_HOST_CRASHDUMP_LOGS: estimate,
+        bugtool.CAP_XAPI_DEBUG: estimate,
+        bugtool.CAP_NETWORK_STATUS: estimate,
+    })
+    bugtool.update_capabilities([bugtool.CAP_XAPI_DEBUG, bugtool.CAP_HOST_CRASHDUMP_LOGS,
+                                 bugtool.CAP_KERNEL_INFO])
+
+    assert sorted(called) == sorted([bugtool.CAP_XAPI_DEBUG, bugtool.CAP_HOST_CRASHDUMP_LOGS])
+    assert bugtool.caps[bugtool.CAP_XAPI_DEBUG][bugtool.MAX_SIZE] == 42
+    assert bugtool.caps[bugtool.CAP_NETWORK_STATUS][bugtool.MAX_SIZE] == 20 * bugtool.KB
+    # Smaller estimates keep the declared output limit:
+    assert bugtool.output_limits[bugtool.CAP_XAPI_DEBUG] == limit
+
+
+def test_cached_estimates(bugtool, mocker):
+    """Assert that --capabilities uses the cached estimates of the expensive estimators"""
+
+    mocker.patch.dict(bugtool.caps)
+    mocker.patch.dict(bugtool.output_limits)
+    called = []
+
+    def estimate(cap):
+        called.append(cap)
+        bugtool.update_cap_size(cap, 64 * bugtool.MB)
+        bugtool.update_cap_time(cap, 100)
+
+    mocker.patch.dict(bugtool.CAP_ESTIMATORS, {
+        bugtool.CAP_XAPI_DEBUG: estimate,
+        bugtool.CAP_NETWORK_STATUS: estimate,
+    })
+    declared = bugtool.caps[bugtool.CAP_XAPI_DEBUG]
+
+    # Without cached estimates, --capabilities shows the declared values:
+    bugtool.update_capabilities([bugtool.CAP_XAPI_DEBUG, bugtool.CAP_NETWORK_STATUS], cached=True)
+    assert called == [bugtool.CAP_NETWORK_STATUS]
+    assert bugtool.caps[bugtool.CAP_XAPI_DEBUG] == declared
+
+    # A collection caches its estimates, which --capabilities shows without estimating:
+    bugtool.update_capabilities([bugtool.CAP_XAPI_DEBUG])
+    assert called == [bugtool.CAP_NETWORK_STATUS, bugtool.CAP_XAPI_DEBUG]
+    mocker.patch.dict(bugtool.caps, {bugtool.CAP_XAPI_DEBUG: declared})
+    bugtool.update_capabilities([bugtool.CAP_XAPI_DEBUG], cached=True)
+    assert len(called) == 2
+    assert bugtool.caps[bugtool.CAP_XAPI_DEBUG][bugtool.MAX_SIZE] == 64 * bugtool.MB
+    assert bugtool.caps[bugtool.CAP_XAPI_DEBUG][bugtool.MAX_TIME] == 100
+    assert bugtool.output_limits[bugtool.CAP_XAPI_DEBUG] == 64 * bugtool.MB
@@ -0,0 +1,144 @@
+"""Unit tests for collecting data using the asyncio collection engine"""
+
+import math
+import sys
+import tarfile
+import time
+
+import pytest
+
+from .test_output import assert_mock_bugtool_plugin_output, minimal_bugtool, read_member
+
+
+def test_asyncio_tar_output(bugtool, tmp_path, dom0_template, mocker):
+    """Assert that the asyncio engine creates the same archive as the select engine"""
+
+    mocker.patch.object(bugtool, "engine", bugtool.ENGINE_ASYNCIO)
+    mocker.patch.object(bugtool, "max_jobs", 4)
+    bugtool.BUG_DIR = tmp_path
+    archive = bugtool.TarOutput("tarball", "tar", -1)
+    subdir = "tar_dir"
+
+    minimal_bugtool(bugtool, dom0_template, archive, subdir, mocker)
+
+    tmp = tmp_path.as_posix()
+    with tarfile.TarFile(tmp + "/tarball.tar") as tar:
+        tar.extractall(tmp)
+        assert_mock_bugtool_plugin_output(tmp, subdir, tar.getnames())
+
+
+def test_asyncio_timeouts(bugtool, tmp_path, mocker):
+    """Assert that commands and callables which run too long are timed out"""
+
+    mocker.patch.object(bugtool, "engine", bugtool.ENGINE_ASYNCIO)
+    mocker.patch.object(bugtool, "max_jobs", 4)
+    mocker.patch.object(bugtool, "unlimited_time", False)
+    bugtool.BUG_DIR = tmp_path
+    bugtool.cap("slow", max_time=1)
+    bugtool.entries = ["slow"]
+    sleep = "import time; print('started', flush=True); time.sleep(10)"
+    bugtool.cmd_output("slow", [sys.executable, "-c", sleep], label="sleep")
+
+    def sleeping_func(_):
+        """Return only after the timeout of the capability"""
+        time.sleep(2)
+        return "done"
+
+    bugtool.func_output("slow", "sleeping_func", sleeping_func)
+    bugtool.func_output("slow", "quick_func", lambda _: "quick")
+
+    archive = bugtool.TarOutput("timeouts", "tar", -1)
+    start = time.time()
+    bugtool.collect_data("timeouts", archive)
+    archive.close()
+    assert time.time() - start < 2.5  # the sleeping_func thread is waited for
+
+    with tarfile.TarFile(tmp_path.as_posix() + "/timeouts.tar") as tar:
+        assert read_member(tar, "timeouts/sleep.out") == b"started\n\n** timeout **\n"
+        assert read_member(tar, "timeouts/sleeping_func.out") == b"\n** timeout **\n"
+        assert read_member(tar, "timeouts/quick_func.out") == b"quick"
+
+
+def test_asyncio_slot_before_collect(bugtool, mocker):
+    """Assert that the lanes of the collector can be created before its event loop runs"""
+
+    mocker.patch.object(bugtool, "deadline", None)
+    collector = bugtool.AsyncioCollector("slots", None)
+    v = {"cap": "vendor", "cmd_args": ["/bin/true"], "group": "array"}
+    assert collector.slot(v) is collector.slot(dict(v))
+    assert collector.slot(dict(v, group="fc")) is not collector.slot(v)
+    collector.executor.shutdown()
+    collector.archive_writer.shutdown()
+
+
+def test_asyncio_jobs(bugtool, mocker, tmp_path):
+    """Assert that the tasks waiting for a job are woken when a job exits or the limit is raised"""
+
+    import asyncio
+
+    mocker.patch.object(bugtool, "XEN_BUGTOOL_LOG", str(tmp_path / "xen-bugtool.log"))
+    mocker.patch.object(bugtool, "adaptive_jobs", True)
+    mocker.patch.object(bugtool, "max_jobs", 2)
+    job_limit = bugtool.JobLimit()
+    job_limit.limit, job_limit.next_check = 1, math.inf
+    mocker.patch.object(bugtool, "job_limit", job_limit)
+    mocker.patch.object(job_limit, "read_load", return_value=0.0)
+    mocker.patch.object(job_limit, "read_pressure", return_value=0.0)
+    entered = []
+
+    async def jobs_test(loop):
+        """Enter the jobs with three tasks, raise the limit to 2, then exit the first"""
+        jobs = bugtool.AsyncioCollector.Jobs(loop)
+        job_limit.listeners.append(jobs.limit_raised)
+        done = dict((name, asyncio.Event()) for name in "abc")
+
+        async def task(name):
+            """Hold a job until the task is done"""
+            async with jobs:
+                entered.append(name)
+                await done[name].wait()
+
+        tasks = [asyncio.ensure_future(task(name)) for name in "abc"]
+        await asyncio.sleep(0.01)
+        assert entered == ["a"]
+        job_limit.next_check = 0  # dom0 is idle: The limit is raised to 2
+        assert job_limit.current() == 2
+        await asyncio.sleep(0.01)
+        assert entered == ["a", "b"]
+        done["a"].set()
+        await asyncio.sleep(0.01)
+        assert entered == ["a", "b", "c"]
+        done["b"].set()
+        done["c"].set()
+        await asyncio.gather(*tasks)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(jobs_test(loop))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+@pytest.mark.parametrize("engine", ["select", "asyncio"])
+def test_deadline_skipped_command(bugtool, tmp_path, mocker, engine):
+    """Assert that both engines archive the commands skipped by --deadline with a marker"""
+
+    mocker.patch.object(bugtool, "engine", engine)
+    mocker.patch.object(bugtool, "XEN_BUGTOOL_LOG", str(tmp_path / "xen-bugtool.log"))
+    mocker.patch.object(bugtool, "unlimited_time", False)
+    bugtool.BUG_DIR = tmp_path
+    bugtool.entries = [bugtool.CAP_YUM, bugtool.CAP_XEN_INFO]
+    bugtool.cmd_output(bugtool.CAP_YUM, ["/bin/echo", "low"], label="low")
+    bugtool.cmd_output(bugtool.CAP_XEN_INFO, ["/bin/echo", "high"], label="high")
+    # Less time left than the expected 1s of the commands: Only PRIORITY_HIGH runs
+    mocker.patch.object(bugtool, "deadline", time.monotonic() + 0.5)
+
+    archive = bugtool.TarOutput("deadline", "tar", -1)
+    bugtool.collect_data("deadline", archive)
+    archive.close()
+
+    with tarfile.TarFile(tmp_path.as_posix() + "/deadline.tar") as tar:
+        assert read_member(tar, "deadline/low.out") == b"** skipped: deadline **\n"
+        assert read_member(tar, "deadline/high.out") == b"high\n"
@@ -20,16 +20,11 @@ def test_dir_list(bugtool):
     # Assert matching cap and path_list produces expected_data
     bugtool.dir_list(cap=cap, path_list=path_list)
 
-    expected_data = {
-        "ls -l "
-        + __file__: {
-            "filter": None,
-            "cap": "xenserver-config",
-            "cmd_args": [
-                "ls",
-                "-l",
-                __file__,
-            ],
-        }
-    }
-    assert bugtool.data == expected_data
+    assert list(bugtool.data) == ["ls -l " + __file__]
+    listing = bugtool.data["ls -l " + __file__]
+    assert listing["cap"] == "xenserver-config"
+    assert listing["parallel"]
+    # For a file, ls -l outputs one line, ending with the name of the file:
+    output = b"".join(listing["func"](cap)).decode()
+    assert output.startswith("-rw") and output.endswith(" " + __file__ + "\n")
+    assert output.count("\n") == 1
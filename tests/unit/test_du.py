@@ -0,0 +1,103 @@
+"""Test the in-process disk usage walker against the output of du"""
+
+import os
+import subprocess
+import tarfile
+import time
+
+import pytest
+
+from .test_output import read_member
+
+DU = "/usr/bin/du"
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """Provide a directory tree with files of different sizes and hard links"""
+    for i, subdir in enumerate(["a/b/c", "a/d", "e", ".hidden"]):
+        (tmp_path / subdir).mkdir(parents=True)
+        (tmp_path / subdir / "file").write_bytes(b"x" * 10000 * (i + 1))
+    (tmp_path / "small").write_bytes(b"x")
+    (tmp_path / "e" / "big").write_bytes(os.urandom(300000))
+    os.link(str(tmp_path / "e" / "big"), str(tmp_path / "e" / "link"))
+    os.link(str(tmp_path / "e" / "big"), str(tmp_path / "a" / "d" / "hard"))
+    return str(tmp_path)
+
+
+@pytest.mark.skipif(not os.path.exists(DU), reason="no du to compare with")
+def test_du_listing(bugtool, tree, mocker):
+    """Assert that du -ax and du -x --threshold output the same sizes as du"""
+
+    mocker.patch.object(bugtool, "max_jobs", 4)
+    mocker.patch.object(bugtool, "DU_SUMMARY_THRESHOLD", 40 * 1024)
+    mocker.patch.object(bugtool, "DU_SPOOL_SIZE", 100)  # the subtrees are spooled to files
+    output = b"".join(bugtool.du_view(tree, 0)).decode().splitlines()
+    # Of the hard links, the first in sorted order, a/d/hard, is counted, even though
+    # the subtree of e is walked in parallel. du counts the first in readdir() order:
+    expected = subprocess.check_output(
+        [DU, "-ax", "--exclude=*/e/big", "--exclude=*/e/link", tree]).decode().splitlines()
+    assert "%s/a/d/hard" % tree in [line.split("\t")[1] for line in output]
+    assert output[-1] == expected[-1]
+    # du lists in the order of readdir(), the walker sorted by name:
+    assert sorted(output) == sorted(expected)
+
+    # The summary is filtered from du_cache, without walking the tree again:
+    mocker.patch.object(bugtool, "du_listing", side_effect=AssertionError("walked again"))
+    threshold = 40 * 1024
+    summary = b"".join(bugtool.du_view(tree, threshold)).splitlines()
+    assert sorted(summary) == sorted(subprocess.check_output(
+        [DU, "-x", "--exclude=*/e/big", "--exclude=*/e/link", "--threshold=%d" % threshold, tree]
+    ).splitlines())
+
+
+def test_du_shares_scans(bugtool, tree, mocker):
+    """Assert that the listings of ls_output() reuse the scans of the du walker"""
+
+    bugtool.entries = [bugtool.CAP_DISK_INFO]
+    bugtool.ls_output(bugtool.CAP_DISK_INFO, "-lR", tree + "/a")
+    bugtool.du_output(bugtool.CAP_DISK_INFO, tree)
+    assert list(bugtool.data) == ["ls -lR %s/a" % tree, "du -ax " + tree]
+    b"".join(bugtool.data["du -ax " + tree]["func"](bugtool.CAP_DISK_INFO))
+
+    # Only the directories below the listed root are kept:
+    assert sorted(bugtool.stat_cache) == [tree + "/a", tree + "/a/b", tree + "/a/b/c", tree + "/a/d"]
+    expected = b"".join(bugtool.ls_listing("-lR", tree + "/a"))
+    mocker.patch.object(bugtool.os, "scandir", side_effect=AssertionError("scanned again"))
+    assert b"".join(bugtool.data["ls -lR %s/a" % tree]["func"](bugtool.CAP_DISK_INFO)) == expected
+
+
+@pytest.mark.parametrize("engine", ["select", "asyncio"])
+def test_du_timeout(bugtool, tree, tmp_path_factory, mocker, engine):
+    """Assert that a du walk is stopped at its timeout and its partial output is archived"""
+
+    bug_dir = tmp_path_factory.mktemp("bug")
+    mocker.patch.object(bugtool, "engine", engine)
+    mocker.patch.object(bugtool, "unlimited_time", False)
+    mocker.patch.object(bugtool, "BUG_DIR", str(bug_dir))
+    mocker.patch.object(bugtool, "XEN_BUGTOOL_LOG", str(bug_dir / "xen-bugtool.log"))
+    bugtool.cap("disk", max_time=1)
+    bugtool.entries = ["disk"]
+    batches = []
+    du_lines = bugtool.du_lines
+
+    def slow_du_lines(sizes, all_files, threshold):
+        """Format a batch of du lines after a delay, counting the batches"""
+        time.sleep(0.4)
+        batches.append(sizes)
+        return du_lines(sizes, all_files, threshold)
+
+    mocker.patch.object(bugtool, "du_lines", side_effect=slow_du_lines)
+    bugtool.du_output("disk", tree)
+    archive = bugtool.TarOutput("du", "tar", -1)
+    bugtool.collect_data("du", archive)
+    archive.close()
+    walked = len(batches)
+    time.sleep(0.5)
+    assert len(batches) == walked  # the walk was stopped, not only abandoned
+
+    with tarfile.TarFile(str(bug_dir / "du.tar")) as tar:
+        output = read_member(tar, "du/du-ax-%s.out" % tree.replace("/", "%"))
+    assert output.splitlines()[0].endswith(("\t%s/.hidden/file" % tree).encode())
+    assert output.endswith(b"\n** timeout **\n")
+    assert tree not in bugtool.du_cache
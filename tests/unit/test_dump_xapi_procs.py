@@ -26,3 +26,31 @@ def test_dump_xapi_subprocess_info(bugtool, fs):
     # Assert the expected result
 
     assert bugtool.dump_xapi_subprocess_info("cap") == expected_result
+
+
+def test_proc_snapshot(bugtool, fs, mocker):
+    """Assert that pidof() and fd_usage() query one shared snapshot of /proc"""
+
+    fs.create_file("/proc/10/status", contents="Name: tapdisk\nPPid:\t1\n")
+    fs.create_file("/proc/10/cmdline", contents="/usr/bin/tapdisk\x00-l\x00")
+    fs.create_symlink("/proc/10/exe", "/usr/bin/tapdisk")
+    fs.create_symlink("/proc/10/fd/0", "/dev/null")
+    fs.create_symlink("/proc/10/fd/1", "/dev/null")
+    fs.create_file("/proc/11/status", contents="PPid:\t10\n")
+    fs.create_file("/proc/11/cmdline", contents="/usr/bin/tapdisk\x00")
+    fs.create_symlink("/proc/11/exe", "/usr/bin/tapdisk")
+    fs.create_symlink("/proc/11/fd/0", "/dev/null")
+    fs.create_file("/proc/12/status", contents="PPid:\t1\n")  # no cmdline: exited
+    fs.create_dir("/proc/self")
+
+    proc_read = mocker.spy(bugtool, "proc_read")
+    assert sorted(bugtool.pidof("tapdisk")) == [10, 11]
+    assert bugtool.pidof("iscsid") == []
+    assert bugtool.fd_usage("cap") == (
+        "Error: Pid 12 disappeared\n"
+        "2: ['/usr/bin/tapdisk -l']\n"
+        "1: ['/usr/bin/tapdisk']\n"
+    )
+    assert bugtool.proc_snapshot()["children"]["10"] == ["11"]
+    # Each process was read once, for all of the queries:
+    assert sorted(call.args[0] for call in proc_read.call_args_list) == ["10", "11", "12"]
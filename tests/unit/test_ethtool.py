@@ -0,0 +1,120 @@
+"""Test the native ethtool queries of xen-bugtool using a fake SIOCETHTOOL layer"""
+
+import errno
+import os
+import struct
+
+import pytest
+
+STATS = [("rx_packets", 1234), ("tx_packets", 5678), ("rx_crc_errors", 0)]
+
+
+def fake_ethtool_ioctl(bugtool):
+    """Return a fake ethtool_ioctl() for eth0 which does not support coalescing"""
+
+    def ethtool_ioctl(ifname, buf):
+        if ifname != "eth0":
+            raise OSError(errno.ENODEV, "No such device")
+        cmd = struct.unpack_from("=I", buf)[0]
+        if cmd == bugtool.ETHTOOL_GDRVINFO:
+            struct.pack_into(
+                "=32s32s32s32s32s12x5I", buf, 4,
+                b"ixgbe", b"5.19.9", b"0x800008ea", b"0000:01:00.0", b"",
+                0, len(STATS), 0, 512, 1024,
+            )
+        elif cmd == bugtool.ETHTOOL_GSTRINGS:
+            assert struct.unpack_from("=2I", buf, 4) == (bugtool.ETH_SS_STATS, len(STATS))
+            for i, (name, _) in enumerate(STATS):
+                struct.pack_into("=32s", buf, 12 + 32 * i, name.encode())
+        elif cmd == bugtool.ETHTOOL_GSTATS:
+            struct.pack_into("=%dQ" % len(STATS), buf, 8, *[value for _, value in STATS])
+        elif cmd == bugtool.ETHTOOL_GRINGPARAM:
+            struct.pack_into("=8I", buf, 4, 4096, 0, 0, 4096, 512, 0, 0, 512)
+        elif cmd == bugtool.ETHTOOL_GCHANNELS:
+            struct.pack_into("=8I", buf, 4, 0, 0, 1, 63, 0, 0, 1, 16)
+        else:
+            raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+    return ethtool_ioctl
+
+
+@pytest.fixture
+def ethtool(bugtool, tmp_path, mocker):
+    """Provide the bugtool with the fake ethtool_ioctl() and a fake ethtool command"""
+    mocker.patch.object(bugtool, "ethtool_ioctl", fake_ethtool_ioctl(bugtool))
+    command = tmp_path / "ethtool"
+    command.write_text("#!/bin/sh\necho ethtool command: \"$@\"\n")
+    os.chmod(str(command), 0o755)
+    mocker.patch.object(bugtool, "ETHTOOL", str(command))
+    return bugtool
+
+
+def test_ethtool_native(ethtool):
+    """Assert the native queries to produce the output format of ethtool"""
+
+    cap = ethtool.CAP_NETWORK_STATUS
+    assert ethtool.ethtool_query(cap, "-i", "eth0") == """\
+driver: ixgbe
+version: 5.19.9
+firmware-version: 0x800008ea
+expansion-rom-version: 
+bus-info: 0000:01:00.0
+supports-statistics: yes
+supports-test: no
+supports-eeprom-access: yes
+supports-register-dump: yes
+supports-priv-flags: no
+"""
+    assert ethtool.ethtool_query(cap, "-S", "eth0") == """\
+NIC statistics:
+     rx_packets: 1234
+     tx_packets: 5678
+     rx_crc_errors: 0
+"""
+    assert ethtool.ethtool_query(cap, "-g", "eth0") == """\
+Ring parameters for eth0:
+Pre-set maximums:
+RX:\t\t4096
+RX Mini:\t0
+RX Jumbo:\t0
+TX:\t\t4096
+Current hardware settings:
+RX:\t\t512
+RX Mini:\t0
+RX Jumbo:\t0
+TX:\t\t512
+
+"""
+    assert ethtool.ethtool_query(cap, "-l", "eth0").splitlines()[2:6] == [
+        "RX:\t\t0", "TX:\t\t0", "Other:\t\t1", "Combined:\t63"
+    ]
+
+
+def test_ethtool_fallback(ethtool):
+    """Assert that unsupported queries and devices fall back to running ethtool"""
+
+    cap = ethtool.CAP_NETWORK_STATUS
+    assert ethtool.ethtool_query(cap, "-c", "eth0") == b"ethtool command: -c eth0\n"
+    assert ethtool.ethtool_query(cap, "-i", "eth1") == b"ethtool command: -i eth1\n"
+
+
+def test_ethtool_output(ethtool, mocker):
+    """Assert that ethtool_output() collects into the files of the ethtool commands"""
+
+    mocker.patch.object(ethtool, "entries", [ethtool.CAP_NETWORK_STATUS])
+    ethtool.ethtool_output(ethtool.CAP_NETWORK_STATUS, "-g", "eth0")
+    entry = ethtool.data["ethtool -g eth0"]
+    assert ethtool.construct_filename("", "ethtool -g eth0", entry) == "ethtool-g-eth0.out"
+    assert entry["func"](ethtool.CAP_NETWORK_STATUS).startswith("Ring parameters for eth0:")
+
+
+def test_ethtool_fallback_timeout(ethtool, tmp_path, mocker):
+    """Assert that the ethtool run as fallback is killed when it times out"""
+
+    (tmp_path / "ethtool").write_text("#!/bin/sh\necho started\nexec /bin/sleep 10\n")
+    mocker.patch.object(ethtool, "task_timeout", return_value=0.5)
+    output_ts = mocker.patch.object(ethtool, "output_ts")
+
+    assert ethtool.ethtool_query(ethtool.CAP_NETWORK_STATUS, "-c", "eth0") == (
+        b"started\n\n** timeout **\n")
+    output_ts.assert_called_once_with("'%s -c eth0' timed out" % ethtool.ETHTOOL)
@@ -0,0 +1,107 @@
+"""Test the in-process zcat, md5sum, strings | grep, ulimit -a and sysctl -A"""
+
+import gzip
+import hashlib
+import os
+
+
+def test_gunzip_and_md5sum(bugtool, tmp_path, mocker):
+    """Assert that gzip files are unzipped in chunks, and files are hashed like md5sum"""
+
+    mocker.patch.object(bugtool, "CHUNK_SIZE", 1000)
+    config = b"".join(b"CONFIG_OPTION_%d=y\n" % i for i in range(1000))
+    with gzip.open(str(tmp_path / "config.gz"), "wb") as f:
+        f.write(config)
+    chunks = list(bugtool.gunzip_file(str(tmp_path / "config.gz")))
+    assert b"".join(chunks) == config
+    assert len(chunks) == len(config) // 1000 + 1
+    assert not list(bugtool.gunzip_file(str(tmp_path / "missing.gz")))
+
+    filename = str(tmp_path / "config")
+    with open(filename, "wb") as f:
+        f.write(config)
+    assert bugtool.md5sum_lines([filename, filename + ".missing"]) == (
+        "%s  %s\n" % (hashlib.md5(config).hexdigest(), filename))
+
+
+def test_grep_strings(bugtool, tmp_path):
+    """Assert that the printable strings containing a word are found like by strings | grep -i"""
+
+    (tmp_path / "ql2400_fw.bin").write_bytes(b"\x00\x01VER\x00fw Version 9.08.02\t(x)\xff\x7fabc")
+    (tmp_path / "ql2500_fw.bin").write_bytes(b"\x02revision\x00\x00ISP2500 firmware ver 8.07")
+    (tmp_path / "ql2600_fw.bin").write_bytes(b"")
+    assert bugtool.grep_strings(str(tmp_path / "ql2*.bin"), "ver") == (
+        b"fw Version 9.08.02\t(x)\n"
+        b"ISP2500 firmware ver 8.07\n"
+    )
+
+
+# "ulimit -a" of /bin/sh (bash-4.2.46 in POSIX mode) in dom0:
+DOM0_ULIMIT_A = """\
+core file size          (blocks, -c) 0
+data seg size           (kbytes, -d) unlimited
+scheduling priority             (-e) 0
+file size               (blocks, -f) unlimited
+pending signals                 (-i) 15394
+max locked memory       (kbytes, -l) 64
+max memory size         (kbytes, -m) unlimited
+open files                      (-n) 1024
+pipe size            (512 bytes, -p) 8
+POSIX message queues     (bytes, -q) 819200
+real-time priority              (-r) 0
+stack size              (kbytes, -s) 8192
+cpu time               (seconds, -t) unlimited
+max user processes              (-u) 15394
+virtual memory          (kbytes, -v) unlimited
+file locks                      (-x) unlimited
+"""
+
+
+def test_ulimit_all(bugtool, mocker):
+    """Assert that the output is the ulimit -a of sh in dom0 for the same limits"""
+
+    unlimited = bugtool.resource.RLIM_INFINITY
+    limits = {
+        bugtool.resource.RLIMIT_CORE: 0,
+        bugtool.resource.RLIMIT_NICE: 0,
+        bugtool.resource.RLIMIT_SIGPENDING: 15394,
+        bugtool.resource.RLIMIT_MEMLOCK: 64 * 1024,
+        bugtool.resource.RLIMIT_NOFILE: 1024,
+        bugtool.resource.RLIMIT_MSGQUEUE: 819200,
+        bugtool.resource.RLIMIT_RTPRIO: 0,
+        bugtool.resource.RLIMIT_STACK: 8192 * 1024,
+        bugtool.resource.RLIMIT_NPROC: 15394,
+    }
+    mocker.patch.object(bugtool.resource, "getrlimit",
+                        side_effect=lambda limit: (limits.get(limit, unlimited), unlimited))
+    assert bugtool.ulimit_all(None) == DOM0_ULIMIT_A
+
+
+def test_sysctl_all(bugtool, tmp_path, mocker):
+    """Assert that the files below /proc/sys are output like by sysctl -A"""
+
+    proc_sys = tmp_path / "sys"
+    (proc_sys / "net" / "ipv4" / "conf" / "eth0.100").mkdir(parents=True)
+    (proc_sys / "net" / "ipv4" / "neigh" / "lo").mkdir(parents=True)
+    (proc_sys / "kernel").mkdir()
+    (proc_sys / "kernel" / "printk").write_bytes(b"4\t4\t1\t7\n")
+    (proc_sys / "kernel" / "multiline").write_bytes(b"one\ntwo\n")
+    (proc_sys / "kernel" / "empty").write_bytes(b"")
+    (proc_sys / "net" / "ipv4" / "conf" / "eth0.100" / "forwarding").write_bytes(b"0\n")
+    (proc_sys / "net" / "ipv4" / "neigh" / "lo" / "retrans_time").write_bytes(b"100\n")
+    (proc_sys / "net" / "ipv4" / "neigh" / "lo" / "retrans_time_ms").write_bytes(b"1000\n")
+    (proc_sys / "net" / "ipv4" / "route_flush").write_bytes(b"")
+    os.chmod(str(proc_sys / "net" / "ipv4" / "route_flush"), 0o200)
+    mocker.patch.object(bugtool, "PROC_SYS", str(proc_sys) + "/")
+    mocker.patch.object(bugtool, "max_jobs", 4)
+
+    output = bugtool.sysctl_all(None).splitlines(True)
+    assert sorted(output) == [
+        b"kernel.multiline = one\n",
+        b"kernel.multiline = two\n",
+        b"kernel.printk = 4\t4\t1\t7\n",
+        b"net.ipv4.conf.eth0/100.forwarding = 0\n",
+        b"net.ipv4.neigh.lo.retrans_time_ms = 1000\n",
+    ]
+    # The lines of the files are kept together, in the order of the directory scan:
+    assert output.index(b"kernel.multiline = two\n") == output.index(b"kernel.multiline = one\n") + 1
@@ -1,5 +1,15 @@
 """Regression tests for bugtool.load_plugins()"""
 
+import json
+import os
+import shutil
+import tarfile
+import time
+
+import pytest
+
+from .test_output import read_member
+
 
 def test_load_plugins(bugtool, dom0_template):
     """Assert () returning arrays of the  in the dom0-template"""
@@ -26,12 +36,11 @@ def test_load_plugins(bugtool, dom0_template):
     # Assert the size of the files of the created mock inventory entry:
     assert bugtool.cap_sizes["mock"] > 0  # /etc/passwd should have content
     # Assert the entries added to the bugtool.data dict:
+    listing = bugtool.data.pop("ls -l /etc")
+    assert listing["cap"] == "mock"
+    assert listing["parallel"]
+    assert b"".join(listing["func"]("mock")).startswith(b"total ")
     assert bugtool.data == {
-        "ls -l /etc": {
-            "cap": "mock",
-            "cmd_args": ["ls", "-l", "/etc"],
-            "filter": None,
-        },
         "/etc/passwd": {
             "cap": "mock",
             "filename": "/etc/passwd",
@@ -53,22 +62,222 @@ def test_load_plugins(bugtool, dom0_template):
 
     # Assert the tree_output entries for /proc/sys/fs/inotify:
     entry_one, entry_two = bugtool.directory_specifications["/proc/sys/fs/inotify"]
-    cap, regex, negate = entry_one
+    cap, regex, negate, options = entry_one
     assert cap == "mock"
     assert regex.pattern == ".*user_.*"
     assert negate
-    cap, regex, negate = entry_two
+    assert options == {}
+    cap, regex, negate, _ = entry_two
     assert cap == "mock"
     assert regex.pattern == ".*max_user_instances.*"
     assert not negate
 
     # Assert the tree_output entry for /proc/sys/fs/epoll:
     entry_one, entry_two = bugtool.directory_specifications["/proc/sys/fs/epoll"]
-    cap, regex, negate = entry_one
+    cap, regex, negate, _ = entry_one
     assert cap == "mock"
     assert regex.pattern == ".*ax_user_watches"
     assert not negate
-    cap, regex, negate = entry_two
+    cap, regex, negate, _ = entry_two
     assert cap == "mock"
     assert regex.pattern == "no"
     assert not negate
+
+
+def test_plugin_cache(bugtool, dom0_template, tmp_path, mocker):
+    """Assert that the plugin manifests are parsed once and cached until they change"""
+
+    plugin_dir = str(tmp_path / "bugtool")
+    shutil.copytree(dom0_template + "/etc/xensource/bugtool", plugin_dir)
+    mocker.patch.object(bugtool, "PLUGIN_DIR", plugin_dir)
+    mocker.patch.object(bugtool, "CACHE_DIR", str(tmp_path / "cache"))
+    parse = mocker.spy(bugtool, "parse_plugin_xml")
+
+    plugins = bugtool.plugin_manifests()
+    name, capability, collect = plugins[0]
+    assert (name, capability["max_size"], len(plugins)) == ("mock", "16384", 1)
+    assert collect[0] == ["list", {}, "/etc"]
+    assert collect[-1] == ["command", {"label": "proc_version"}, "cat /proc/version"]
+    assert parse.call_count == 2
+
+    # Both passes of load_plugins() use the manifests parsed once in this run:
+    bugtool.entries = ["mock"]
+    bugtool.load_plugins(just_capabilities=True)
+    bugtool.load_plugins()
+    assert "proc_version" in bugtool.data
+    assert parse.call_count == 2
+
+    # The next run uses the cache, until a manifest is changed:
+    with open(str(tmp_path / "cache" / "plugins.json")) as cache:
+        assert json.load(cache)["plugins"] == plugins
+    bugtool.plugin_cache.clear()
+    assert bugtool.plugin_manifests() == plugins
+    assert parse.call_count == 2
+
+    bugtool.plugin_cache.clear()
+    stuff = os.path.join(plugin_dir, "mock", "stuff.xml")
+    with open(stuff, "w") as f:
+        f.write("<collect><files>/etc/hosts</files></collect>")
+    os.utime(stuff, ns=(0, 0))
+    assert bugtool.plugin_manifests()[0][2] == [["files", {}, "/etc/hosts"]]
+    assert parse.call_count == 4
+
+    # A change of the contents which keeps the size and mtime is detected as well:
+    bugtool.plugin_cache.clear()
+    with open(stuff, "w") as f:
+        f.write("<collect><files>/etc/host2</files></collect>")
+    os.utime(stuff, ns=(0, 0))
+    assert bugtool.plugin_manifests()[0][2] == [["files", {}, "/etc/host2"]]
+    assert parse.call_count == 6
+
+    # A cache file which others can write is not used:
+    bugtool.plugin_cache.clear()
+    os.chmod(str(tmp_path / "cache" / "plugins.json"), 0o664)
+    assert bugtool.plugin_manifests()[0][2] == [["files", {}, "/etc/host2"]]
+    assert parse.call_count == 8
+    assert os.stat(str(tmp_path / "cache" / "plugins.json")).st_mode & 0o777 == 0o600
+
+
+def test_plugin_dir_trailing_slash(bugtool, dom0_template, tmp_path, mocker):
+    """Assert that the plugin manifests are found when PLUGIN_DIR ends with a slash"""
+
+    mocker.patch.object(bugtool, "PLUGIN_DIR", dom0_template + "/etc/xensource/bugtool/")
+    mocker.patch.object(bugtool, "CACHE_DIR", str(tmp_path / "cache"))
+    plugins = bugtool.plugin_manifests()
+    assert [(name, capability["max_size"]) for name, capability, _ in plugins] == [("mock", "16384")]
+    assert plugins[0][2][-1] == ["command", {"label": "proc_version"}, "cat /proc/version"]
+
+
+VENDOR_COLLECT = """<collect>
+<command label="hung" timeout="1" parallel="array" priority="low">/bin/sleep 5</command>
+<command label="slow" parallel="fc">/bin/sleep 2.5</command>
+<command label="verbose" max_output="4">echo 0123456789</command>
+<files max_output="1">/etc/passwd</files>
+<files priority="high">/etc/group</files>
+</collect>
+"""
+
+
+@pytest.mark.parametrize("engine", ["select", "asyncio"])
+def test_plugin_command_options(bugtool, tmp_path, mocker, engine):
+    """Assert that the timeout, priority, parallel and max_output attributes are applied"""
+
+    plugin_dir = tmp_path / "bugtool"
+    (plugin_dir / "vendor").mkdir(parents=True)
+    (plugin_dir / "vendor.xml").write_text('<capability max_time="60"/>')
+    (plugin_dir / "vendor" / "collect.xml").write_text(VENDOR_COLLECT)
+    mocker.patch.object(bugtool, "PLUGIN_DIR", str(plugin_dir))
+    mocker.patch.object(bugtool, "BUG_DIR", str(tmp_path))
+    mocker.patch.object(bugtool, "engine", engine)
+    mocker.patch.object(bugtool, "unlimited_time", False)
+    mocker.patch.object(bugtool, "max_jobs", 2)  # also the number of parallel groups at a time
+    bugtool.entries = ["vendor"]
+    bugtool.load_plugins()
+
+    assert bugtool.data["hung"]["max_time"] == 1
+    assert bugtool.data["hung"]["group"] == "array"
+    assert bugtool.data["hung"]["priority"] == bugtool.PRIORITY_LOW
+    assert bugtool.data["verbose"]["max_output"] == 4
+    assert "/etc/passwd" not in bugtool.data
+    assert bugtool.data["/etc/group"]["priority"] == bugtool.PRIORITY_HIGH
+
+    # The commands of the parallel groups do not wait for each other or the others:
+    archive = bugtool.TarOutput("vendor", "tar", -1)
+    start = time.monotonic()
+    bugtool.collect_data("vendor", archive)
+    assert time.monotonic() - start < 3.2
+    archive.close()
+
+    with tarfile.TarFile(str(tmp_path / "vendor.tar")) as tar:
+        assert read_member(tar, "vendor/hung.out") == b"\n** timeout **\n"
+        verbose = read_member(tar, "vendor/verbose.out")
+    assert verbose.startswith(b"012\n** 7 bytes omitted")
+    assert verbose.endswith(b"\n")
+
+
+PYTHON_COLLECTOR = """
+import threading
+loads = []
+release = threading.Event()
+loads.append(__name__)
+
+def status(cap):
+    yield b"status of %s\\n" % cap.encode()
+    yield b"x" * 100
+
+def config(cap):
+    return "config loaded %d time(s)\\n" % len(loads)
+
+def hang(cap):
+    release.wait()  # never returns unless the test releases it
+    return "late"
+"""
+
+
+@pytest.mark.parametrize("engine", ["select", "asyncio"])
+def test_python_collector(bugtool, tmp_path, mocker, engine):
+    """Assert that the Python collectors of plugins are loaded once and run in-process
+
+    A collector which never returns is archived as timed out, without waiting for it.
+    """
+
+    plugin_dir = tmp_path / "bugtool"
+    (plugin_dir / "vendor").mkdir(parents=True)
+    (plugin_dir / "vendor.xml").write_text('<capability max_time="60"/>')
+    (plugin_dir / "vendor" / "collector.py").write_text(PYTHON_COLLECTOR)
+    (plugin_dir / "vendor" / "collect.xml").write_text("""<collect>
+<python module="collector" function="status" max_output="64"/>
+<python module="collector" function="config" label="vendor_config"/>
+<python module="collector" function="hang" timeout="0.2"/>
+<python module="../collector" function="status"/>
+</collect>
+""")
+    mocker.patch.object(bugtool, "PLUGIN_DIR", str(plugin_dir))
+    mocker.patch.object(bugtool, "BUG_DIR", str(tmp_path))
+    mocker.patch.object(bugtool, "engine", engine)
+    mocker.patch.object(bugtool, "unlimited_time", False)
+    mocker.patch.object(bugtool, "unlimited_data", False)
+    bugtool.entries = ["vendor"]
+    bugtool.load_plugins()
+    assert sorted(bugtool.data) == ["collector.hang", "collector.status", "vendor_config"]
+
+    archive = bugtool.TarOutput("vendor", "tar", -1)
+    start = time.monotonic()
+    try:
+        bugtool.collect_data("vendor", archive)
+        assert time.monotonic() - start < 1.5
+    finally:
+        bugtool.plugin_module(str(plugin_dir / "vendor" / "collector.py")).release.set()
+    archive.close()
+
+    with tarfile.TarFile(str(tmp_path / "vendor.tar")) as tar:
+        status = read_member(tar, "vendor/collector.status")
+        assert read_member(tar, "vendor/vendor_config.out") == b"config loaded 1 time(s)\n"
+        assert read_member(tar, "vendor/collector.hang") == b"\n** timeout **\n"
+    assert status.startswith(b"status of vendor\n")
+    assert b"bytes omitted" in status
+    assert list(bugtool.plugin_modules) == [str(plugin_dir / "vendor" / "collector.py")]
+
+
+def test_plugin_malformed_options(bugtool, tmp_path, mocker):
+    """Assert that malformed attributes of plugin elements are logged and ignored"""
+
+    plugin_dir = tmp_path / "bugtool"
+    (plugin_dir / "vendor").mkdir(parents=True)
+    (plugin_dir / "vendor.xml").write_text('<capability max_time="60"/>')
+    (plugin_dir / "vendor" / "collect.xml").write_text(
+        '<collect><command label="status" timeout="30s" priority="urgent" max_output="-1"'
+        ' parallel="array">true</command></collect>'
+    )
+    mocker.patch.object(bugtool, "PLUGIN_DIR", str(plugin_dir))
+    log = mocker.patch.object(bugtool, "log")
+    bugtool.entries = ["vendor"]
+    bugtool.load_plugins()
+
+    assert bugtool.data["status"] == {"cap": "vendor", "cmd_args": "true", "filter": None,
+                                      "group": "array"}
+    assert [c.args[0] for c in log.call_args_list] == [
+        'Ignoring timeout="30s" of plugin vendor',
+        'Ignoring max_output="-1" of plugin vendor',
+        'Ignoring priority="urgent" of plugin vendor',
+    ]
@@ -0,0 +1,83 @@
+"""Test the in-process directory listings against the output of GNU ls"""
+
+import os
+import stat
+import subprocess
+import tarfile
+import time
+
+import pytest
+
+from .test_output import read_member
+
+LS = "/bin/ls"
+
+
+def ls(flags, path):
+    """Return the output of the real ls in the C locale"""
+    env = dict(os.environ, LC_ALL="C")
+    return subprocess.run([LS, flags, path], stdout=subprocess.PIPE, env=env, check=False).stdout
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """Provide a directory tree with files, directories, links and device nodes"""
+    (tmp_path / "dir" / "sub").mkdir(parents=True)
+    (tmp_path / "dir" / "sub" / "file").write_bytes(b"x" * 5000)
+    (tmp_path / "dir" / ".hidden").mkdir()
+    (tmp_path / "dir" / ".hidden" / "file").write_bytes(b"")
+    (tmp_path / "Zfile").write_bytes(b"z")
+    (tmp_path / "old").write_bytes(b"")
+    os.utime(str(tmp_path / "old"), (0, 0))
+    os.symlink("dir/sub", str(tmp_path / "link"))
+    os.chmod(str(tmp_path / "Zfile"), 0o4755)
+    try:
+        os.mknod(str(tmp_path / "dir" / "null"), 0o666 | stat.S_IFCHR, os.makedev(1, 3))
+        os.mknod(str(tmp_path / "dir" / "sda1"), 0o660 | stat.S_IFBLK, os.makedev(8, 17))
+    except OSError:
+        pass  # not running as root
+    return str(tmp_path)
+
+
+@pytest.mark.skipif(not os.path.exists(LS), reason="no ls to compare with")
+@pytest.mark.parametrize("flags", ["-l", "-lR", "-R"])
+def test_ls_listing(bugtool, tree, flags):
+    """Assert that the listings are the same as the output of ls"""
+
+    assert b"".join(bugtool.ls_listing(flags, tree)) == ls(flags, tree)
+    # Arguments which are not directories are listed themselves:
+    for path in (tree + "/Zfile", tree + "/link"):
+        assert b"".join(bugtool.ls_listing(flags, path)) == ls(flags, path)
+    assert b"".join(bugtool.ls_listing(flags, tree + "/missing")) == b""
+
+
+@pytest.mark.parametrize("engine", ["select", "asyncio"])
+def test_ls_queued_timeout(bugtool, tree, tmp_path_factory, mocker, engine):
+    """Assert that a listing which waits for a worker beyond its timeout is cancelled"""
+
+    bug_dir = tmp_path_factory.mktemp("bug")
+    mocker.patch.object(bugtool, "engine", engine)
+    mocker.patch.object(bugtool, "max_jobs", 1)
+    mocker.patch.object(bugtool, "unlimited_time", False)
+    mocker.patch.object(bugtool, "BUG_DIR", str(bug_dir))
+    mocker.patch.object(bugtool, "XEN_BUGTOOL_LOG", str(bug_dir / "xen-bugtool.log"))
+    listing = mocker.patch.object(bugtool, "ls_listing", return_value=iter([b"listed\n"]))
+    bugtool.cap("disk", max_time=1)
+    bugtool.entries = ["disk"]
+
+    def blocker(_):
+        """Keep the only worker beyond the timeout, like a func which is not a generator"""
+        time.sleep(2.5)
+        return b"done"
+
+    bugtool.func_output("disk", "blocker", blocker)
+    bugtool.data["blocker"]["parallel"] = True
+    bugtool.ls_output("disk", "-lR", tree)
+
+    archive = bugtool.TarOutput("ls", "tar", -1)
+    bugtool.collect_data("ls", archive)
+    archive.close()
+
+    listing.assert_not_called()
+    with tarfile.TarFile(str(bug_dir / "ls.tar")) as tar:
+        assert read_member(tar, "ls/ls-lR-%s.out" % tree.replace("/", "%")) == b"\n** timeout **\n"
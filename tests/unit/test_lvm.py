@@ -0,0 +1,143 @@
+"""Test rendering the LVM command outputs from the JSON report of lvm fullreport"""
+
+import json
+import os
+
+import pytest
+
+MB = 1024 * 1024
+
+FULLREPORT = {
+    "report": [
+        {
+            "vg": [{"vg_name": "VG_XenStorage-1f0e", "vg_fmt": "lvm2", "pv_count": "1",
+                    "lv_count": "2", "snap_count": "0", "vg_attr": "wz--n-",
+                    "vg_size": str(2000 * 1024 * MB - 4 * MB), "vg_free": str(1024 * MB)}],
+            "pv": [{"pv_name": "/dev/sdb", "vg_name": "VG_XenStorage-1f0e", "pv_fmt": "lvm2",
+                    "pv_attr": "a--", "pv_size": str(2000 * 1024 * MB - 4 * MB),
+                    "pv_free": str(1024 * MB)}],
+            "lv": [
+                {"lv_name": name, "vg_name": "VG_XenStorage-1f0e", "lv_attr": attr,
+                 "lv_size": str(size), "pool_lv": "", "origin": "", "data_percent": "",
+                 "metadata_percent": "", "move_pv": "", "mirror_log": "",
+                 "copy_percent": "", "convert_lv": "",
+                 "lv_path": "/dev/VG_XenStorage-1f0e/" + name, "lv_uuid": uuid,
+                 "lv_permissions": "writeable", "lv_host": "xs-host",
+                 "lv_time": "2024-05-06 07:08:09 +0000", "lv_active": active,
+                 "lv_device_open": "open", "seg_count": "1",
+                 "lv_allocation_policy": "inherit", "lv_read_ahead": "auto",
+                 "lv_kernel_read_ahead": str(128 * 1024), "lv_kernel_major": "253",
+                 "lv_kernel_minor": "0", "vg_extent_size": str(4 * MB)}
+                for name, attr, size, uuid, active in [
+                    ("MGT", "-wi-a-----", 4 * MB, "uuid-mgt", "active"),
+                    ("VHD-abc", "-wi-------", 8 * 1024 * MB, "uuid-vhd", ""),
+                ]
+            ],
+            "seg": [
+                {"lv_uuid": "uuid-mgt", "segtype": "linear", "seg_start_pe": "0",
+                 "seg_size_pe": "1", "stripes": "1", "stripe_size": "0",
+                 "seg_pe_ranges": "/dev/sdb:0-0"},
+                {"lv_uuid": "uuid-vhd", "segtype": "striped", "seg_start_pe": "0",
+                 "seg_size_pe": "2048", "stripes": "2", "stripe_size": str(64 * 1024),
+                 "seg_pe_ranges": "/dev/sdb:1-1024 /dev/sdc:0-1023"},
+            ],
+        },
+    ]
+}
+
+
+@pytest.fixture
+def lvm(bugtool, tmp_path, mocker):
+    """Provide the bugtool with a fake lvm command which prints FULLREPORT"""
+    (tmp_path / "fullreport.json").write_text(json.dumps(FULLREPORT))
+    script = tmp_path / "lvm"
+    script.write_text("#!/bin/sh\ncat %s\n" % (tmp_path / "fullreport.json"))
+    os.chmod(str(script), 0o755)
+    mocker.patch.object(bugtool, "LVM", str(script))
+    return bugtool
+
+
+def test_lvm_reports(lvm):
+    """Assert the outputs of vgscan, pvs, vgs and lvs rendered from lvm fullreport"""
+
+    cap = lvm.CAP_DISK_INFO
+    assert lvm.lvm_view(cap, [lvm.VGSCAN]) == (
+        '  Found volume group "VG_XenStorage-1f0e" using metadata type lvm2\n'
+    )
+    assert lvm.lvm_view(cap, [lvm.PVS]) == (
+        "  PV       VG                 Fmt  Attr  PSize PFree\n"
+        "  /dev/sdb VG_XenStorage-1f0e lvm2 a--  <1.96t 1.00g\n"
+    )
+    assert lvm.lvm_view(cap, [lvm.VGS]) == (
+        "  VG                 #PV #LV #SN Attr    VSize VFree\n"
+        "  VG_XenStorage-1f0e   1   2   0 wz--n- <1.96t 1.00g\n"
+    )
+    assert lvm.lvm_view(cap, [lvm.LVS]) == (
+        "  LV      VG                 Attr       LSize Pool Origin Data% Meta% Move Log Cpy%Sync Convert\n"
+        "  MGT     VG_XenStorage-1f0e -wi-a----- 4.00m\n"
+        "  VHD-abc VG_XenStorage-1f0e -wi------- 8.00g\n"
+    )
+
+
+def test_lvdisplay_map(lvm):
+    """Assert the output of lvdisplay --map rendered from lvm fullreport"""
+
+    lines = lvm.lvm_view(lvm.CAP_DISK_INFO, [lvm.LVDISPLAY, "--map"]).splitlines()
+    assert lines[:17] == [
+        "  --- Logical volume ---",
+        "  LV Path                /dev/VG_XenStorage-1f0e/MGT",
+        "  LV Name                MGT",
+        "  VG Name                VG_XenStorage-1f0e",
+        "  LV UUID                uuid-mgt",
+        "  LV Write Access        read/write",
+        "  LV Creation host, time xs-host, 2024-05-06 07:08:09 +0000",
+        "  LV Status              available",
+        "  # open                 1",
+        "  LV Size                4.00 MiB",
+        "  Current LE             1",
+        "  Segments               1",
+        "  Allocation             inherit",
+        "  Read ahead sectors     auto",
+        "  - currently set to     256",
+        "  Block device           253:0",
+        "   ",
+    ]
+    assert lines[17:23] == [
+        "  --- Segments ---",
+        "  Logical extents 0 to 0:",
+        "    Type\t\tlinear",
+        "    Physical volume\t/dev/sdb",
+        "    Physical extents\t0 to 0",
+        "   ",
+    ]
+    assert "  LV Status              NOT available" in lines
+    assert lines[-12:] == [
+        "  Logical extents 0 to 2047:",
+        "    Type\t\tstriped",
+        "    Stripes\t\t2",
+        "    Stripe size\t\t64.00 KiB",
+        "    Stripe 0:",
+        "      Physical volume\t/dev/sdb",
+        "      Physical extents\t1 to 1024",
+        "    Stripe 1:",
+        "      Physical volume\t/dev/sdc",
+        "      Physical extents\t0 to 1023",
+        "   ",
+        "   ",
+    ]
+
+
+def test_lvm_fallback(lvm, tmp_path, mocker):
+    """Assert that the LVM commands run if lvm fullreport fails, but it runs only once"""
+
+    (tmp_path / "fullreport.json").write_text("")
+    script = tmp_path / "vgs"
+    script.write_text("#!/bin/sh\necho vgs output; echo >>%s\n" % (tmp_path / "runs"))
+    os.chmod(str(script), 0o755)
+    mocker.patch.object(lvm, "VGS", str(script))
+    mocker.patch.dict(lvm.LVM_VIEWS, {str(script): lvm.lvm_vgs})
+
+    assert lvm.lvm_view(lvm.CAP_DISK_INFO, [lvm.VGS]) == b"vgs output\n"
+    assert lvm.lvm_report_cache == {"reports": None}
+    assert lvm.lvm_view(lvm.CAP_DISK_INFO, [lvm.VGS]) == b"vgs output\n"
+    assert (tmp_path / "runs").read_text() == "\n\n"
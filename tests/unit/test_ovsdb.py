@@ -0,0 +1,220 @@
+"""Test rendering the ovs-vsctl outputs from an OVSDB stand-in server"""
+
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+UUIDS = dict((name, "00000000-0000-0000-0000-%012d" % i) for i, name in enumerate(
+    ["ovs", "xenbr0", "xenbr1", "p-xenbr0", "p-eth0", "p-vif1.0", "p-xapi1", "p-vif2.0",
+     "p-xenbr1", "p-eth1", "i-xenbr0", "i-eth0", "i-vif1.0", "i-xapi1", "i-vif2.0",
+     "i-xenbr1", "i-eth1"]))
+
+UNLIMITED_UUIDS = {"key": {"type": "uuid"}, "min": 0, "max": "unlimited"}
+SCHEMA = {"name": "Open_vSwitch", "tables": {
+    "Open_vSwitch": {"columns": {
+        "bridges": {"type": UNLIMITED_UUIDS},
+        "ovs_version": {"type": {"key": "string", "min": 0, "max": 1}},
+        "external_ids": {"type": {"key": "string", "value": "string", "min": 0, "max": "unlimited"}},
+    }},
+    "Bridge": {"columns": {"name": {"type": "string"}, "ports": {"type": UNLIMITED_UUIDS}}},
+    "Port": {"columns": {
+        "name": {"type": "string"},
+        "interfaces": {"type": UNLIMITED_UUIDS},
+        "tag": {"type": {"key": "integer", "min": 0, "max": 1}},
+        "fake_bridge": {"type": "boolean"},
+    }},
+    "Interface": {"columns": {"name": {"type": "string"}, "ofport": {"type": "integer"}}},
+    "Controller": {"columns": {"target": {"type": "string"}}},
+}}
+
+
+def uuid(name):
+    """Return the OVSDB datum of the UUID of a row name"""
+    return ["uuid", UUIDS[name]]
+
+
+def uuids(*names):
+    """Return the OVSDB set datum of the UUIDs of row names"""
+    return ["set", [uuid(name) for name in names]]
+
+
+def port(name, tag=None, fake_bridge=False):
+    """Return the Port row of an interface name"""
+    return {"_uuid": uuid("p-" + name), "_version": uuid("ovs"), "name": name,
+            "interfaces": uuids("i-" + name), "tag": tag if tag else ["set", []],
+            "fake_bridge": fake_bridge}
+
+
+ROWS = {
+    "Open_vSwitch": [{"_uuid": uuid("ovs"), "bridges": uuids("xenbr1", "xenbr0"),
+                      "ovs_version": "2.17.7",
+                      "external_ids": ["map", [["xs-network-uuids", "a;b"], ["hostname", "xs8"]]]}],
+    "Bridge": [
+        {"_uuid": uuid("xenbr0"), "name": "xenbr0",
+         "ports": uuids("p-xenbr0", "p-eth0", "p-vif1.0", "p-xapi1", "p-vif2.0")},
+        {"_uuid": uuid("xenbr1"), "name": "xenbr1", "ports": uuids("p-xenbr1", "p-eth1")},
+    ],
+    "Port": [port("xenbr0"), port("eth0"), port("vif1.0"), port("xapi1", 10, True),
+             port("vif2.0", 10), port("xenbr1"), port("eth1")],
+    "Interface": [{"_uuid": uuid("i-" + name), "name": name, "ofport": i}
+                  for i, name in enumerate(["xenbr0", "eth0", "vif1.0", "xapi1", "vif2.0",
+                                            "xenbr1", "eth1"])],
+    "Controller": [],
+}
+
+
+class UnixStandIn(threading.Thread):
+    """Stand-in server thread serving the connections to a unix socket until it is closed"""
+
+    def __init__(self, path):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(5)
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with conn:
+                self.serve(conn)
+
+    def serve(self, conn):
+        """Serve the requests of one connection"""
+        raise NotImplementedError
+
+
+class OvsdbStandIn(UnixStandIn):
+    """Minimal OVSDB server answering get_schema and select transactions"""
+
+    def __init__(self, path):
+        UnixStandIn.__init__(self, path)
+        self.requests = []
+
+    def serve(self, conn):
+        """Reply to the JSON-RPC requests of one connection"""
+        buf = ""
+        decoder = json.JSONDecoder()
+        while True:
+            data = conn.recv(4096)
+            if not data:
+                return
+            buf += data.decode()
+            while buf:
+                try:
+                    request, end = decoder.raw_decode(buf)
+                except ValueError:
+                    break
+                buf = buf[end:]
+                self.requests.append(request["method"])
+                result = SCHEMA if request["method"] == "get_schema" else [
+                    {"rows": ROWS[op["table"]]} for op in request["params"][1:]]
+                # Send an echo request first, like the inactivity probe of the server:
+                conn.sendall(b'{"method":"echo","params":[],"id":"echo"}')
+                conn.sendall(json.dumps({"result": result, "error": None, "id": request["id"]}).encode())
+
+
+@pytest.fixture
+def ovsdb(bugtool, tmp_path, mocker):
+    """Provide the bugtool connected to an OVSDB stand-in server"""
+    mocker.patch.object(bugtool, "OPENVSWITCH_DB_SOCKET", str(tmp_path / "db.sock"))
+    server = OvsdbStandIn(str(tmp_path / "db.sock"))
+    server.start()
+    yield bugtool, server
+    server.server.close()
+
+
+def test_ovs_vsctl_list(ovsdb):
+    """Assert ovs-vsctl list rendered like ovs-vsctl from one OVSDB snapshot"""
+
+    bugtool, server = ovsdb
+    cap = bugtool.CAP_NETWORK_STATUS
+    assert bugtool.ovs_vsctl_view(cap, ["list", "open_vswitch"]) == (
+        "_uuid               : 00000000-0000-0000-0000-000000000000\n"
+        "bridges             : [00000000-0000-0000-0000-000000000001, "
+        "00000000-0000-0000-0000-000000000002]\n"
+        'external_ids        : {hostname="xs8", xs-network-uuids="a;b"}\n'
+        'ovs_version         : "2.17.7"\n'
+    )
+    bridges = bugtool.ovs_vsctl_view(cap, ["list", "bridge"])
+    assert bridges.split("\n\n")[1] == (
+        "_uuid               : 00000000-0000-0000-0000-000000000002\n"
+        'name                : "xenbr1"\n'
+        "ports               : [00000000-0000-0000-0000-000000000008, "
+        "00000000-0000-0000-0000-000000000009]\n"
+    )
+    ports = bugtool.ovs_vsctl_view(cap, ["list", "port"])
+    assert "fake_bridge         : true\n" in ports
+    assert "tag                 : []\n" in ports
+    assert "tag                 : 10\n" in ports
+    assert bugtool.ovs_vsctl_view(cap, ["list", "controller"]) == ""
+    # One connection with one get_schema and one transact for all tables:
+    assert server.requests == ["get_schema", "transact"]
+
+
+def test_ovs_vsctl_bridges(ovsdb):
+    """Assert list-br, list-ports and list-ifaces with a VLAN (fake) bridge"""
+
+    bugtool, server = ovsdb
+    cap = bugtool.CAP_NETWORK_STATUS
+    assert bugtool.br_list() == ["xapi1", "xenbr0", "xenbr1"]
+    assert bugtool.ovs_vsctl_view(cap, ["list-br"]) == "xapi1\nxenbr0\nxenbr1\n"
+    assert bugtool.ovs_vsctl_view(cap, ["list-ports", "xenbr0"]) == "eth0\nvif1.0\n"
+    assert bugtool.ovs_vsctl_view(cap, ["list-ports", "xapi1"]) == "vif2.0\n"
+    assert bugtool.ovs_vsctl_view(cap, ["list-ifaces", "xenbr1"]) == "eth1\n"
+    assert server.requests == ["get_schema", "transact"]
+
+
+def test_ovs_vsctl_fallback(bugtool, tmp_path, mocker):
+    """Assert that ovs-vsctl runs when the OVSDB server cannot be reached"""
+
+    mocker.patch.object(bugtool, "OPENVSWITCH_DB_SOCKET", str(tmp_path / "db.sock"))
+    script = tmp_path / "ovs-vsctl"
+    script.write_text("#!/bin/sh\necho ovs-vsctl \"$@\"\n")
+    os.chmod(str(script), 0o755)
+    mocker.patch.object(bugtool, "OVS_VSCTL", str(script))
+
+    assert bugtool.ovs_vsctl_view(bugtool.CAP_NETWORK_STATUS, ["list", "port"]) == b"ovs-vsctl list port\n"
+    assert bugtool.br_list() == ["ovs-vsctl list-br"]
+
+
+class ChunkedSocket:
+    """Socket stand-in which receives the given chunks, one per recv()"""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.sent = b""
+
+    def settimeout(self, timeout):
+        """Ignore the timeout, the chunks are ready"""
+
+    def sendall(self, data):
+        """Record the sent requests"""
+        self.sent += data
+
+    def recv(self, _):
+        """Return the next chunk, b"" at the end like a closed connection"""
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+def test_ovsdb_rpc_chunks(bugtool):
+    """Assert that the replies are parsed when characters and strings span the chunks"""
+
+    name = 'bré {["x\\'  # a multi-byte character, brackets, a quote and a backslash
+    reply = json.dumps({"result": {"name": name}, "error": None, "id": 0}, ensure_ascii=False).encode()
+    split = reply.index(b"\xc3") + 1  # between the two bytes of the UTF-8 sequence of é
+    escape = reply.index(b"\\") + 1  # after the backslash escaping the quote
+    chunks = [b' {"method":"echo","params":[],"id":"echo"}\n', reply[:split],
+              reply[split:escape], reply[escape:] + b'{"result":[],"error":null,"id":1}']
+    sock = ChunkedSocket(chunks)
+    assert bugtool.ovsdb_rpc(sock, [("a", []), ("b", [])], 1) == [{"name": name}, []]
+    assert b'"method": "b"' in sock.sent
+
+    with pytest.raises(IOError, match="OVSDB connection closed"):
+        bugtool.ovsdb_rpc(ChunkedSocket([reply[:-1]]), [("a", [])], 1)
@@ -0,0 +1,318 @@
+"""Benchmarks of xen-bugtool's collection code paths on large synthetic outputs
+
+Each benchmark compares the optimised code path with the code path it replaces,
+prints the measured times (shown with pytest -s) and asserts the speedup, or
+for the --low-impact mode, the impact on a background workload. The startup
+benchmark asserts that importing xen-bugtool and --capabilities stay within
+their time budgets. Benchmarks marked with @pytest.mark.benchmark assert on
+wall-clock times and only run with pytest --benchmarks.
+"""
+
+from __future__ import print_function
+
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import time
+import zipfile
+
+import pytest
+
+from .test_output import read_member
+
+# Synthetic command output like from "ss -nampio" or "xenstore-ls -f":
+LARGE_OUTPUT_LINES = 200000
+LARGE_OUTPUT_LINE = '/local/domain/42/device/vif/0/state = "4"\\n'
+LARGE_OUTPUT_CMD = [
+    sys.executable,
+    "-c",
+    "import sys; sys.stdout.write('%s' * %d)" % (LARGE_OUTPUT_LINE, LARGE_OUTPUT_LINES),
+]
+
+
+def run_large_output(bugtool, bulk_read, output_filter=None):
+    """Run LARGE_OUTPUT_CMD using the given read mode, return its output and runtime"""
+
+    bugtool.ProcOutput.bulk_read = bulk_read
+    output = io.BytesIO()
+    proc = bugtool.ProcOutput(LARGE_OUTPUT_CMD, 60, output, output_filter)
+    start = time.time()
+    try:
+        bugtool.run_procs([[proc]])
+    finally:
+        bugtool.ProcOutput.bulk_read = True
+    return output.getvalue(), time.time() - start
+
+
+def test_bulk_read(bugtool, mocker):
+    """Assert that a large command output is read in chunks, with the same output as by lines"""
+
+    lines, _ = run_large_output(bugtool, bulk_read=False)
+    chunk_reads = []
+    os_read = os.read
+
+    def read(fd, size):
+        """Record the sizes of the chunks read from the output pipe"""
+        data = os_read(fd, size)
+        if size == bugtool.ProcOutput.chunk_size:
+            chunk_reads.append(len(data))
+        return data
+
+    mocker.patch.object(bugtool.os, "read", side_effect=read)
+    chunks, _ = run_large_output(bugtool, bulk_read=True)
+
+    assert chunks == lines
+    assert len(chunks.splitlines()) == LARGE_OUTPUT_LINES
+    # The output is read in chunks of many lines, not line by line:
+    assert sum(chunk_reads) == len(chunks)
+    assert len(chunk_reads) < LARGE_OUTPUT_LINES / 100
+
+
+@pytest.mark.benchmark
+def test_bulk_read_benchmark(bugtool):
+    """Benchmark reading a large command output in chunks instead of line by line"""
+
+    lines, line_time = run_large_output(bugtool, bulk_read=False)
+    chunks, chunk_time = run_large_output(bugtool, bulk_read=True)
+
+    print("\n%d lines: readline: %.3fs, chunks: %.3fs" % (LARGE_OUTPUT_LINES, line_time, chunk_time))
+    assert chunks == lines
+    assert chunk_time * 3 < line_time
+
+
+def test_bulk_read_line_filter(bugtool):
+    """Assert the line filter to get the same lines in both read modes"""
+
+    def count_lines(line, state):
+        """Line filter which prefixes each line with its line number"""
+        state["lines"] = state.get("lines", 0) + 1
+        return b"%d:%s" % (state["lines"], line)
+
+    lines, _ = run_large_output(bugtool, False, count_lines)
+    chunks, _ = run_large_output(bugtool, True, count_lines)
+
+    assert chunks == lines
+    assert chunks.splitlines()[-1].startswith(b"%d:/local" % LARGE_OUTPUT_LINES)
+
+
+def test_bulk_read_unterminated_line(bugtool):
+    """Assert that the filter gets the last line of the output without a newline"""
+
+    output = io.BytesIO()
+    proc = bugtool.ProcOutput("printf 'a\\nb\\nc'", 10, output, lambda line, _: line.upper())
+    bugtool.run_procs([[proc]])
+    assert output.getvalue() == b"A\nB\nC"
+
+
+# Synthetic background I/O workload like tapdisk: Writes 1MB blocks, syncs every 8MB
+# and prints its runtime:
+BACKGROUND_IO_CMD = [
+    sys.executable,
+    "-c",
+    "import os, sys, time; start = time.time(); block = b'x' * 1048576\n"
+    "with open(sys.argv[1], 'wb') as f:\n"
+    "    for i in range(256):\n"
+    "        f.write(block)\n"
+    "        if i % 8 == 7: f.flush(); os.fsync(f.fileno())\n"
+    "print(time.time() - start)",
+]
+ARCHIVED_FILE_SIZE = 16 * 1024 * 1024
+
+
+def run_background_io(tmp_path, archive_file=None):
+    """Run BACKGROUND_IO_CMD, and while it runs, archive_file(), return their runtimes"""
+
+    background = subprocess.Popen(BACKGROUND_IO_CMD + [str(tmp_path / "background")], stdout=subprocess.PIPE)
+    start = time.time()
+    if archive_file:
+        archive_file()
+    archive_time = time.time() - start
+    background_time = float(background.communicate()[0])
+    return background_time, archive_time
+
+
+@pytest.mark.benchmark
+def test_low_impact_benchmark(bugtool, tmp_path, mocker):
+    """Benchmark the slowdown of background I/O by archiving files with --low-impact"""
+
+    source = tmp_path / "var-log-messages"
+    source.write_bytes(os.urandom(1024 * 1024) * (ARCHIVED_FILE_SIZE // (1024 * 1024)))
+
+    def archive_file():
+        with open(str(tmp_path / "bugtool.tar"), "wb") as tar:
+            archive = bugtool.TarOutput("bug-report", "tar", os.dup(tar.fileno()))
+            archive.addRealFile("bug-report/var/log/messages", str(source))
+            archive.close()
+
+    alone, _ = run_background_io(tmp_path)
+    full_speed, full_speed_archive = run_background_io(tmp_path, archive_file)
+    rate = 16 * bugtool.MB
+    mocker.patch.object(bugtool, "io_rate_limiter", bugtool.RateLimiter(rate))
+    low_impact, low_impact_archive = run_background_io(tmp_path, archive_file)
+
+    print(
+        "\nBackground I/O: alone: %.3fs, while archiving %dMB: at full speed: %.3fs (%.3fs), "
+        "low-impact at %dMB/s: %.3fs (%.3fs)"
+        % (alone, ARCHIVED_FILE_SIZE // bugtool.MB, full_speed, full_speed_archive,
+           rate // bugtool.MB, low_impact, low_impact_archive)
+    )
+    # The file was archived with the rate limit (which allows a burst of max_burst):
+    assert low_impact_archive >= ARCHIVED_FILE_SIZE / rate - bugtool.RateLimiter.max_burst
+    # and slowed the background I/O less than archiving it at full speed:
+    assert low_impact - alone < full_speed - alone
+    with tarfile.open(str(tmp_path / "bugtool.tar")) as tar:
+        assert read_member(tar, "bug-report/var/log/messages") == source.read_bytes()
+
+
+def test_rate_limiter(bugtool, mocker):
+    """Assert that the RateLimiter sleeps until the data read fits into its rate"""
+
+    clock = [1000.0]
+    mocker.patch("time.monotonic", side_effect=lambda: clock[0])
+    sleep = mocker.patch("time.sleep", side_effect=lambda delay: clock.__setitem__(0, clock[0] + delay))
+    limiter = bugtool.RateLimiter(10 * bugtool.MB)
+
+    # The first 1MB is within the burst of max_burst seconds at the rate:
+    limiter.throttle(1 * bugtool.MB)
+    assert sleep.call_count == 0
+    # 20MB more need 2s at 10MB/s, minus the burst:
+    for _ in range(20):
+        limiter.throttle(1 * bugtool.MB)
+    assert clock[0] == pytest.approx(1000.0 + 2.1 - bugtool.RateLimiter.max_burst)
+    # After idle time, only a burst of max_burst seconds is allowed without sleeping:
+    clock[0] += 60
+    sleep.reset_mock()
+    limiter.throttle(2 * bugtool.MB)
+    assert sum(call.args[0] for call in sleep.call_args_list) == pytest.approx(0.2 - 0.1)
+
+
+def test_low_impact_zip(bugtool, tmp_path, mocker):
+    """Assert that ZIP archives get the same file contents with the rate limit"""
+
+    mocker.patch.object(bugtool, "BUG_DIR", str(tmp_path))
+    mocker.patch.object(bugtool, "io_rate_limiter", bugtool.RateLimiter(64 * bugtool.MB))
+    source = tmp_path / "messages"
+    source.write_bytes(b"kernel: line\n" * 100000)
+
+    archive = bugtool.ZipOutput("bug-report")
+    archive.addRealFile("bug-report/var/log/messages", str(source))
+    archive.close()
+    with zipfile.ZipFile(str(tmp_path / "bug-report.zip")) as zip_file:
+        info = zip_file.getinfo("bug-report/var/log/messages")
+        assert info.compress_type == zipfile.ZIP_DEFLATED
+        assert zip_file.read(info) == source.read_bytes()
+
+
+def fake_modinfo(bugtool, tmp_path, mocker, modules):
+    """Provide /proc/modules and a modinfo for the modules, which logs its calls to tmp_path/calls"""
+
+    proc_modules = tmp_path / "modules"
+    proc_modules.write_text("".join("%s 16384 0 - Live 0x0\n" % m for m in modules))
+    modinfo = tmp_path / "modinfo"
+    modinfo.write_text('#!/bin/sh\necho "$#" >>%s\n'
+                       'for m in "$@"; do printf "name:           %%s\\n" "$m"; done\n'
+                       % (tmp_path / "calls"))
+    os.chmod(str(modinfo), 0o755)
+    mocker.patch.object(bugtool, "PROC_MODULES", str(proc_modules))
+    mocker.patch.object(bugtool, "MODINFO", str(modinfo))
+    return str(modinfo)
+
+
+def test_module_info(bugtool, tmp_path, mocker):
+    """Assert that modinfo runs for batches of modules, with the output of one modinfo per module"""
+
+    modules = ["module_%d" % i for i in range(200)]
+    modinfo = fake_modinfo(bugtool, tmp_path, mocker, modules)
+    output = io.BytesIO()
+    bugtool.run_procs([[bugtool.ProcOutput([modinfo, m], 60, output) for m in modules]])
+    (tmp_path / "calls").unlink()
+
+    batched = bugtool.module_info(bugtool.CAP_KERNEL_INFO)
+    assert batched == output.getvalue()
+    assert batched.count(b"\n") == len(modules)
+    calls = [int(n) for n in (tmp_path / "calls").read_text().split()]
+    assert sorted(calls) == sorted([bugtool.MODINFO_BATCH] * (len(modules) // bugtool.MODINFO_BATCH)
+                                   + [len(modules) % bugtool.MODINFO_BATCH])
+
+
+@pytest.mark.benchmark
+def test_module_info_benchmark(bugtool, tmp_path, mocker):
+    """Benchmark modinfo for batches of modules instead of one modinfo per module"""
+
+    modules = ["module_%d" % i for i in range(200)]
+    modinfo = fake_modinfo(bugtool, tmp_path, mocker, modules)
+
+    # The replaced code path: One modinfo process per module
+    start = time.time()
+    output = io.BytesIO()
+    bugtool.run_procs([[bugtool.ProcOutput([modinfo, m], 60, output) for m in modules]])
+    single_time = time.time() - start
+
+    start = time.time()
+    batched = bugtool.module_info(bugtool.CAP_KERNEL_INFO)
+    batched_time = time.time() - start
+
+    print("\n%d modules: modinfo per module: %.3fs, batched: %.3fs"
+          % (len(modules), single_time, batched_time))
+    assert batched == output.getvalue()
+    assert batched_time * 5 < single_time
+
+
+# Time budgets of the startup of xen-bugtool, which management tools call often:
+IMPORT_BUDGET = 0.3
+CAPABILITIES_BUDGET = 0.2
+# Modules which are imported on first use, not when xen-bugtool is imported:
+LAZY_MODULES = ["asyncio", "defusedxml.sax", "platform", "pprint", "tarfile",
+                "urllib.request", "xml.dom.minidom", "xml.etree.ElementTree", "zipfile"]
+IMPORT_TIME = """
+import json, sys, time
+from importlib import machinery, util
+start = time.monotonic()
+if sys.argv[1] == "modules":
+    for module in sys.argv[2:]:
+        __import__(module)
+else:
+    loader = machinery.SourceFileLoader("bugtool", sys.argv[1])
+    spec = util.spec_from_loader("bugtool", loader)
+    module = util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+print(json.dumps([time.monotonic() - start, [m for m in sys.argv[2:] if m in sys.modules]]))
+"""
+
+
+def import_time(*args):
+    """Return the time to import the arguments in a new interpreter and the LAZY_MODULES loaded"""
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_TIME] + list(args))
+    return json.loads(output.decode())
+
+
+def test_lazy_imports(testdir):
+    """Assert that importing xen-bugtool does not import the LAZY_MODULES"""
+
+    _, loaded = import_time(testdir + "/../../xen-bugtool", *LAZY_MODULES)
+    assert loaded == []
+
+
+@pytest.mark.benchmark
+def test_startup_benchmark(bugtool, testdir, tmp_path, mocker):
+    """Benchmark importing xen-bugtool and running --capabilities against their budgets"""
+
+    bugtool_time, _ = import_time(testdir + "/../../xen-bugtool")
+    modules_time, _ = import_time("modules", *LAZY_MODULES)
+
+    mocker.patch.dict(bugtool.caps)  # --capabilities updates the estimates
+    mocker.patch.object(bugtool, "XEN_BUGTOOL_LOG", str(tmp_path / "xen-bugtool.log"))
+    mocker.patch.object(bugtool, "XENSOURCE_INVENTORY", str(tmp_path / "xensource-inventory"))
+    mocker.patch.object(bugtool, "PLUGIN_DIR", str(tmp_path))
+    (tmp_path / "xensource-inventory").write_text("")
+    start = time.time()
+    assert bugtool.main(["xen-bugtool", "--capabilities"]) == 0
+    capabilities_time = time.time() - start
+
+    print("\nimport: %.3fs (the lazy modules: %.3fs), --capabilities: %.3fs"
+          % (bugtool_time, modules_time, capabilities_time))
+    assert bugtool_time < IMPORT_BUDGET
+    assert capabilities_time < CAPABILITIES_BUDGET
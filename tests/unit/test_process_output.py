@@ -1,5 +1,13 @@
 """Regression tests for the bugtool helper function mdadm_arrays()"""
 
+import io
+import os
+import sys
+import threading
+import time
+
+SLEEP = [sys.executable, "-c", "import sys, time; time.sleep(float(sys.argv[1]))"]
+
 
 def test_mdadm_arrays(bugtool, dom0_template):
     """Assert mdadm_arrays() returning arrays dom0_template/usr/sbin/mdadm"""
@@ -37,3 +45,236 @@ def test_multipathd_topology(bugtool, dom0_template):
 
     bugtool.MULTIPATHD = dom0_template + "/usr/sbin/multipathd"
     assert bugtool.multipathd_topology(bugtool.CAP_MULTIPATH) == "multipathd-k"
+
+
+# Creates a file in argv[1] and waits until argv[2] files are there (for up to 10s):
+BARRIER = [
+    sys.executable,
+    "-c",
+    "import os, sys, time; open(os.path.join(sys.argv[1], str(os.getpid())), 'w').close()\n"
+    "end = time.time() + 10\n"
+    "while len(os.listdir(sys.argv[1])) < int(sys.argv[2]) and time.time() < end:\n"
+    "    time.sleep(0.01)",
+]
+
+
+def run_parallel(bugtool, mocker, tmp_path, groups, commands_per_group):
+    """Run groups of commands which wait for max_jobs of them to run, return the most running"""
+
+    tmp_path.mkdir()
+    barrier = [str(tmp_path), str(min(bugtool.max_jobs, groups * commands_per_group))]
+    procs = [
+        [bugtool.ProcOutput(BARRIER + barrier, 30) for _ in range(commands_per_group)]
+        for _ in range(groups)
+    ]
+    running = []
+    run = bugtool.ProcOutput.run
+
+    def counting_run(self):
+        """Record the number of commands which run when a command is started"""
+        run(self)
+        running.append(sum(p.running for group in procs for p in group))
+
+    mocker.patch.object(bugtool.ProcOutput, "run", counting_run)
+    bugtool.run_procs(procs)
+    assert all(p.status == 0 for group in procs for p in group)
+    assert len(running) == groups * commands_per_group
+    return max(running)
+
+
+def test_run_procs_jobs(bugtool, mocker, tmp_path):
+    """Assert run_procs() running up to max_jobs commands of all groups in parallel"""
+
+    mocker.patch.object(bugtool, "max_jobs", 4)
+    # Two groups of two commands each all run at the same time:
+    assert run_parallel(bugtool, mocker, tmp_path / "4", groups=2, commands_per_group=2) == 4
+
+    mocker.patch.object(bugtool, "max_jobs", 2)
+    # With two jobs, four commands run two at a time:
+    assert run_parallel(bugtool, mocker, tmp_path / "2", groups=2, commands_per_group=2) == 2
+
+    mocker.patch.object(bugtool, "max_jobs", 1)
+    # The default is to run one command after the other:
+    assert run_parallel(bugtool, mocker, tmp_path / "1", groups=1, commands_per_group=3) == 1
+
+
+def test_run_procs_deadline(bugtool, mocker, capsys):
+    """Assert run_procs() skipping low priority commands and running hang lanes"""
+
+    mocker.patch.object(bugtool, "max_jobs", 1)
+    mocker.patch.object(bugtool, "unlimited_time", False)
+    mocker.patch.object(bugtool, "HANG_PRONE_COMMANDS", [sys.executable])
+
+    # Less time left than the expected 1s of the commands: Only PRIORITY_HIGH runs
+    mocker.patch.object(bugtool, "deadline", time.monotonic() + 0.5)
+    low = bugtool.ProcOutput("true", 10, cap=bugtool.CAP_YUM)
+    high = bugtool.ProcOutput("true", 10, cap=bugtool.CAP_XEN_INFO)
+    bugtool.run_procs([[low, high]])
+    assert low.status is None and low.timed_out
+    assert high.status == 0
+    assert "Skipping 'true' of yum: " in capsys.readouterr().out
+
+    # A hanging command in its lane does not delay the other commands:
+    mocker.patch.object(bugtool, "deadline", time.monotonic() + 30)
+    hang = bugtool.ProcOutput(SLEEP + ["5"], 1, cap=bugtool.CAP_XEN_INFO)
+    cheap = [bugtool.ProcOutput("true", 10) for _ in range(3)]
+    assert hang.lane == os.path.basename(sys.executable) and hang.cost == 1
+    start = time.time()
+    bugtool.run_procs([[hang], cheap])
+    assert all(p.status == 0 for p in cheap)
+    assert hang.timed_out
+    assert time.time() - start < 4
+
+
+def test_group_lanes_limit(bugtool):
+    """Assert that the lanes of plugin groups run one at a time and share a limit"""
+
+    def grouped(group):
+        proc = bugtool.ProcOutput("true", 10)
+        proc.lane = proc.group = "vendor/" + group
+        return proc
+
+    array, array2, fc, iscsi = grouped("array"), grouped("array"), grouped("fc"), grouped("iscsi")
+    other = bugtool.ProcOutput("true", 10)
+    assert not bugtool.has_free_slot(array2, [array], 2)
+    assert bugtool.has_free_slot(fc, [array, other], 2)
+    assert not bugtool.has_free_slot(iscsi, [array, fc], 2)
+    assert bugtool.has_free_slot(other, [array, fc], 1)
+
+
+def process_gone(pid):
+    """Return True if the process does not exist anymore or is a zombie"""
+    try:
+        with open("/proc/%d/stat" % pid) as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] == "Z"
+    except IOError:
+        return True
+
+
+def test_run_procs_kills_process_group(bugtool, mocker):
+    """Assert run_procs() killing all processes of a timed out shell command"""
+
+    mocker.patch.object(bugtool, "unlimited_time", False)
+    mocker.patch.object(bugtool, "KILL_GRACE_TIME", 0.5)
+    # The shell starts a child which ignores SIGTERM and reports its pid:
+    ignore_term = (
+        "import os, signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+        "print(os.getpid(), flush=True); time.sleep(30)"
+    )
+    output = io.BytesIO()
+    proc = bugtool.ProcOutput("%s -c '%s'; echo done" % (sys.executable, ignore_term), 0.5, output)
+    start = time.monotonic()
+    bugtool.run_procs([[proc]])
+
+    assert proc.timed_out
+    # Terminated after 0.5s, killed after the grace time, not after a full second:
+    assert time.monotonic() - start < 1.5
+    pid = int(output.getvalue().split()[0])
+    for _ in range(50):  # SIGKILL was sent, give the kernel a moment to deliver it
+        if process_gone(pid):
+            break
+        time.sleep(0.01)
+    assert process_gone(pid)
+
+
+def test_bounded_command_output(bugtool, mocker):
+    """Assert that command output beyond its size limit keeps only its head and tail"""
+
+    mocker.patch.dict(bugtool.caps)
+    mocker.patch.dict(bugtool.cap_sizes)
+    mocker.patch.dict(bugtool.output_limits)
+    mocker.patch.object(bugtool, "unlimited_data", False)
+    bugtool.cap("limited", max_size=4000)
+
+    output = bugtool.command_output("numbers", "limited")
+    numbers = "import sys; [print('%06d' % i) for i in range(100000)]"
+    proc = bugtool.ProcOutput([sys.executable, "-c", numbers], 10, output)
+    bugtool.run_procs([[proc]])
+
+    # The tail has a quarter of the limit, the head the remaining part:
+    lines = output.getvalue().splitlines()
+    assert lines[0] == b"000000"
+    assert lines[-1] == b"099999"
+    assert b"bytes omitted, size constraint of limited exceeded" in output.getvalue()
+    assert 4000 <= len(output.getvalue()) < 4100
+    assert bugtool.cap_sizes["limited"] == 4000
+
+    # The outputs of the capability share its limit, so the next one is omitted:
+    output = bugtool.command_output("more", "limited")
+    output.write(b"more\n")
+    assert output.getvalue() == b"\n** 5 bytes omitted, size constraint of limited exceeded **\n"
+    assert bugtool.cap_sizes["limited"] == 4000
+
+    # Output within the limit is not changed:
+    bugtool.cap_sizes["limited"] = 3990
+    output = bugtool.command_output("short", "limited")
+    output.write(b"short\n")
+    assert output.getvalue() == b"short\n"
+    assert bugtool.cap_sizes["limited"] == 3996
+
+
+def test_job_limit(bugtool, in_tmpdir, mocker):
+    """Assert that --jobs=auto lowers the jobs under pressure and raises them when idle"""
+
+    mocker.patch.object(bugtool, "max_jobs", 8)
+    mocker.patch.object(bugtool, "adaptive_jobs", True)
+    mocker.patch.object(bugtool, "PROC_LOADAVG", str(in_tmpdir.join("loadavg")))
+    mocker.patch.object(bugtool, "PROC_PRESSURE", str(in_tmpdir.mkdir("pressure")) + "/")
+    mocker.patch("os.cpu_count", return_value=4)
+
+    def set_load(loadavg, io_avg10):
+        in_tmpdir.join("loadavg").write("%.2f 1.00 1.00 2/345 6789\n" % loadavg)
+        in_tmpdir.join("pressure", "io").write(
+            "some avg10=%.2f avg60=0.00 avg300=0.00 total=0\n"
+            "full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n" % io_avg10
+        )
+
+    job_limit = bugtool.JobLimit()
+    job_limit.check_interval = 0
+    set_load(1.0, 0.0)
+    assert job_limit.current() == 5  # starts with half of max_jobs, idle: +1
+    assert job_limit.current() == 6
+    set_load(1.0, 60.0)  # I/O pressure halves the jobs
+    assert job_limit.current() == 3
+    set_load(8.0, 0.0)  # So does a load of 2 per CPU
+    assert job_limit.current() == 1
+    assert job_limit.current() == 1
+    set_load(3.0, 20.0)  # Moderate load keeps the number of jobs
+    assert job_limit.current() == 1
+
+    with open(bugtool.XEN_BUGTOOL_LOG) as log:
+        assert log.read().splitlines()[-1] == (
+            "Jobs: 3 -> 1 (load per CPU 2.00, pressure cpu 0.0% io 0.0% memory 0.0%)"
+        )
+    os.remove(bugtool.XEN_BUGTOOL_LOG)
+
+
+def test_kill_terminated_concurrent(bugtool, mocker):
+    """Assert that a process group terminated during kill_terminated() is not lost"""
+
+    first, second = bugtool.ProcOutput(SLEEP + ["10"], 10), bugtool.ProcOutput(SLEEP + ["10"], 10)
+    first.run()
+    second.run()
+    first_proc, second_proc = first.proc, second.proc
+    first.terminate()
+    alive = bugtool.process_group_alive
+    other = threading.Thread(target=second.terminate)
+
+    def terminate_concurrently(pid):
+        """Terminate the second process from another thread while the list is rebuilt"""
+        if other.ident is None:
+            other.start()
+            other.join(0.2)
+            assert other.is_alive()  # waits for the lock to add to ProcOutput.terminated
+        return alive(pid)
+
+    mocker.patch.object(bugtool, "process_group_alive", terminate_concurrently)
+    bugtool.ProcOutput.kill_terminated()
+    other.join()
+    assert [proc for proc, _ in bugtool.ProcOutput.terminated] == [first_proc, second_proc]
+
+    mocker.patch.object(bugtool, "KILL_GRACE_TIME", 0)
+    mocker.patch.object(bugtool, "process_group_alive", alive)
+    bugtool.ProcOutput.terminated = [(proc, 0) for proc, _ in bugtool.ProcOutput.terminated]
+    bugtool.ProcOutput.kill_terminated(wait=True)
+    assert not bugtool.ProcOutput.terminated
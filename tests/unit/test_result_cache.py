@@ -0,0 +1,89 @@
+"""Test caching the outputs of slow commands in CACHE_DIR across bug reports"""
+
+import os
+import tarfile
+from xml.dom.minidom import parseString
+
+import pytest
+
+from .test_output import read_member
+
+
+def collect(bugtool, tmp_path, subdir):
+    """Collect the data into a tarball, return the outputs and cache states of the inventory"""
+    bugtool.entries = ["hardware"]
+    bugtool.data = {}
+    bugtool.cmd_output("hardware", [str(tmp_path / "slow-command")], label="slow",
+                       cache=[bugtool.CACHE_BOOT])
+    bugtool.func_output("hardware", "slow_func", lambda _: b"func output",
+                        cache=[bugtool.CACHE_BOOT])
+    bugtool.cmd_output("hardware", ["/bin/echo", "not cached"], label="fast")
+    archive = bugtool.TarOutput(subdir, "tar", -1)
+    bugtool.collect_data(subdir, archive)
+    bugtool.include_inventory(archive, subdir)
+    archive.close()
+
+    with tarfile.TarFile(str(tmp_path / (subdir + ".tar"))) as tar:
+        inventory = parseString(read_member(tar, subdir + "/inventory.xml"))
+        states = dict((os.path.basename(el.getAttribute("filename")), el.getAttribute("cache"))
+                      for el in inventory.getElementsByTagName("inventory-entry"))
+        return read_member(tar, subdir + "/slow.out"), states
+
+
+@pytest.mark.parametrize("engine", ["select", "asyncio"])
+def test_result_cache(bugtool, tmp_path, mocker, engine):
+    """Assert that cached outputs are archived until their invalidation key changes"""
+
+    mocker.patch.object(bugtool, "engine", engine)
+    mocker.patch.object(bugtool, "BUG_DIR", str(tmp_path))
+    mocker.patch.object(bugtool, "BOOT_ID", str(tmp_path / "boot_id"))
+    bugtool.cap("hardware", max_time=10)
+    (tmp_path / "boot_id").write_text("boot-1\n")
+    script = tmp_path / "slow-command"
+    script.write_text("#!/bin/sh\necho run >> %s\ncat %s\n" % (tmp_path / "runs", tmp_path / "runs"))
+    os.chmod(str(script), 0o755)
+
+    output, states = collect(bugtool, tmp_path, "first")
+    assert output == b"run\n"
+    assert states == {"slow.out": "fresh", "slow_func.out": "fresh", "fast.out": ""}
+
+    # The command is not run again, its output is copied from the cache:
+    output, states = collect(bugtool, tmp_path, "second")
+    assert output == b"run\n"
+    assert states == {"slow.out": "cached", "slow_func.out": "cached", "fast.out": ""}
+
+    # After a reboot, the command is run again:
+    (tmp_path / "boot_id").write_text("boot-2\n")
+    output, states = collect(bugtool, tmp_path, "third")
+    assert output == b"run\nrun\n"
+    assert states["slow.out"] == "fresh"
+
+    # Without the invalidation key, the output is not cached:
+    (tmp_path / "boot_id").unlink()
+    output, states = collect(bugtool, tmp_path, "fourth")
+    assert output == b"run\nrun\nrun\n"
+    assert states["slow.out"] == "fresh"
+
+
+def test_result_cache_limits(bugtool, tmp_path, mocker):
+    """Assert that outputs with PII are not cached, and that cached outputs are bounded"""
+
+    mocker.patch.object(bugtool, "BOOT_ID", str(tmp_path / "boot_id"))
+    mocker.patch.object(bugtool, "unlimited_data", False)
+    mocker.patch.dict(bugtool.caps)
+    mocker.patch.dict(bugtool.cap_sizes)
+    mocker.patch.dict(bugtool.output_limits)
+    (tmp_path / "boot_id").write_text("boot-1\n")
+    bugtool.cap("serials", bugtool.PII_YES)
+    bugtool.cap("limited", max_size=100)
+
+    private = {"cap": "serials", "cmd_args": ["dmidecode"], "cache": [bugtool.CACHE_BOOT]}
+    bugtool.cache_result("serials.out", private, b"serial numbers")
+    assert not os.listdir(bugtool.CACHE_DIR)
+
+    # Cached outputs are bounded and accounted like the streamed outputs of commands:
+    entry = {"cap": "limited", "cmd_args": ["lspci"], "cache": [bugtool.CACHE_BOOT]}
+    bugtool.cache_result("lspci.out", entry, b"x" * 1000)
+    cached = bugtool.cached_result("lspci.out", entry)
+    assert b"bytes omitted, size constraint of limited exceeded" in cached.getvalue()
+    assert bugtool.cap_sizes["limited"] == 100
@@ -0,0 +1,96 @@
+"""Test sharing the archive of one collection between concurrent invocations"""
+
+import fcntl
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def shared(bugtool, tmp_path, mocker):
+    """Provide the bugtool with the files of the shared collections in tmp_path"""
+    mocker.patch.object(bugtool, "COLLECTION_LOCK", str(tmp_path / "lock"))
+    mocker.patch.object(bugtool, "COLLECTION_READERS_LOCK", str(tmp_path / "readers"))
+    mocker.patch.object(bugtool, "COLLECTION_STATE", str(tmp_path / "state"))
+    return bugtool
+
+
+def wait_for_readers(path):
+    """Wait until an invocation holds a shared lock on the readers lock"""
+    with open(path, "a") as f:
+        for _ in range(100):
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(f, fcntl.LOCK_UN)
+            except OSError:
+                return
+            time.sleep(0.05)
+    raise AssertionError("no invocation attached")
+
+
+def test_shared_collection(shared, tmp_path):
+    """Assert that an invocation with the same options gets a copy of the archive"""
+
+    leader = shared.SharedCollection("key")
+    assert leader.start(lead=True) is None
+    assert leader.leader
+
+    # Invocations with other options collect the data themselves right away:
+    other = shared.SharedCollection("other")
+    assert other.start(lead=True) is None
+    assert not other.leader
+
+    results = []
+
+    def follow():
+        follower = shared.SharedCollection("key")
+        archive = follower.start(lead=True)
+        results.append(follower.copy(archive, str(tmp_path / "copy.tar"), -1))
+
+    thread = threading.Thread(target=follow)
+    thread.start()
+    wait_for_readers(str(tmp_path / "readers"))
+    (tmp_path / "report.tar").write_bytes(b"archive")
+    leader.finish(str(tmp_path / "report.tar"))  # returns after the copy
+    thread.join()
+    assert results == [0]
+
+    assert (tmp_path / "copy.tar").read_bytes() == b"archive"
+    assert not (tmp_path / "state").exists()
+
+
+def test_shared_collection_failed(shared, tmp_path):
+    """Assert that attached invocations collect the data if the collection fails"""
+
+    leader = shared.SharedCollection("key")
+    assert leader.start(lead=True) is None
+    results = []
+
+    def follow():
+        results.append(shared.SharedCollection("key").start(lead=True))
+
+    thread = threading.Thread(target=follow)
+    thread.start()
+    wait_for_readers(str(tmp_path / "readers"))
+    leader.finish(None)
+    thread.join()
+    assert results == [None]
+
+
+def test_shared_collection_timeout(shared, tmp_path, mocker):
+    """Assert that attached invocations collect the data if the collection takes too long"""
+
+    mocker.patch.object(shared, "SHARED_COLLECTION_WAIT", 0.3)
+    log = mocker.patch.object(shared, "log")
+    leader = shared.SharedCollection("key")
+    assert leader.start(lead=True) is None
+
+    start = time.monotonic()
+    assert shared.SharedCollection("key").start(lead=True) is None
+    assert 0.3 <= time.monotonic() - start < 5
+    log.assert_called_once()
+    assert "did not finish in 0.3 seconds" in log.call_args.args[0]
+
+    # The leader does not wait for the invocation which gave up:
+    leader.finish(str(tmp_path / "report.tar"))
@@ -0,0 +1,86 @@
+"""Test waiting for the logs of signalled tapdisk processes using inotify"""
+
+import subprocess
+import sys
+import time
+
+# A stand-in for tapdisk2 which writes its log in parts when it gets SIGUSR1:
+TAPDISK = """
+import os, signal, sys, time
+def write_log(signum, frame):
+    for i in range(5):
+        with open(sys.argv[1] + "/tapdisk.%d.log" % os.getpid(), "a") as log:
+            log.write("log line %d\\n" % i)
+        time.sleep(0.05)
+signal.signal(signal.SIGUSR1, write_log)
+print("ready", flush=True)
+while True:
+    time.sleep(1)
+"""
+
+
+def test_generate_tapdisk_logs(bugtool, tmp_path, mocker):
+    """Assert that the logs are collected once they are complete, without waiting a second"""
+
+    (tmp_path / "blktap").mkdir()
+    mocker.patch.object(bugtool, "TAPDISK_LOG_DIR", str(tmp_path / "blktap"))
+    mocker.patch.object(bugtool, "TAPBACK_LOG_DIR", str(tmp_path / "tapback"))
+    mocker.patch.object(bugtool, "TAPDISK_SIGNAL_BATCH", 2)
+    bugtool.entries = [bugtool.CAP_TAPDISK_LOGS]
+    tapdisks = [subprocess.Popen([sys.executable, "-c", TAPDISK, str(tmp_path / "blktap")],
+                                 stdout=subprocess.PIPE) for _ in range(3)]
+    try:
+        for tapdisk in tapdisks:
+            assert tapdisk.stdout and tapdisk.stdout.readline() == b"ready\n"
+        pids = [tapdisk.pid for tapdisk in tapdisks]
+        mocker.patch.object(bugtool, "pidof", lambda name: pids if name == "tapdisk2" else [])
+
+        start = time.monotonic()
+        bugtool.generate_tapdisk_logs()
+        duration = time.monotonic() - start
+    finally:
+        for tapdisk in tapdisks:
+            tapdisk.kill()
+            tapdisk.wait()
+            if tapdisk.stdout:
+                tapdisk.stdout.close()
+
+    assert duration < bugtool.TAPDISK_LOG_SILENCE
+    for pid in pids:
+        filename = str(tmp_path / "blktap" / ("tapdisk.%d.log" % pid))
+        assert bugtool.data[filename] == {"cap": bugtool.CAP_TAPDISK_LOGS, "filename": filename}
+        with open(filename) as log:
+            assert log.read().count("log line") == 5
+
+
+def test_wait_for_logs_unchanged(bugtool, tmp_path, mocker):
+    """Assert a second without changes if the log of a signalled process is not changed"""
+
+    mocker.patch.object(bugtool, "TAPDISK_LOG_SILENCE", 0.3)
+    watcher = bugtool.Inotify([str(tmp_path)], bugtool.INOTIFY_WRITES)
+    try:
+        (tmp_path / "tapdisk.12345.log").write_text("line\n")
+        (tmp_path / "tapdisk.log.99999").write_text("line\n")  # not the log of pid 99999
+        start = time.monotonic()
+        assert bugtool.wait_for_logs(watcher, [12345, 99999])
+        assert 0.3 <= time.monotonic() - start < 1
+    finally:
+        watcher.close()
+
+
+def test_wait_for_logs_tapback(bugtool, tmp_path, mocker):
+    """Assert that the tapback logs, which have no pid in their names, need no second"""
+
+    mocker.patch.object(bugtool, "TAPDISK_LOG_SILENCE", 5)
+    watcher = bugtool.Inotify([str(tmp_path)], bugtool.INOTIFY_WRITES)
+    try:
+        (tmp_path / "tapdisk.12345.log.1").write_text("line\n")
+        (tmp_path / "tapback.log").write_text("line\n")
+        start = time.monotonic()
+        assert bugtool.wait_for_logs(watcher, [12345, bugtool.TAPBACK_LOG])
+        assert time.monotonic() - start < 1
+    finally:
+        watcher.close()
+    assert bugtool.log_writer("tapdisk.12345.log.1") == 12345
+    assert bugtool.log_writer("tapback.1.log") == bugtool.TAPBACK_LOG
+    assert bugtool.log_writer("tapdisk.log") is None
@@ -0,0 +1,130 @@
+"""Test walking the xenstore tree over the socket of a xenstored stand-in"""
+
+import os
+import struct
+
+import pytest
+
+from .test_ovsdb import UnixStandIn
+
+HEADER = struct.Struct("=IIII")
+XS_DIRECTORY, XS_READ, XS_ERROR = 1, 2, 16
+
+TREE = {
+    "/local": b"",
+    "/local/domain": b"",
+    "/local/domain/0": b"",
+    "/local/domain/0/name": b"Domain-0",
+    "/local/domain/1": b"",
+    "/local/domain/1/name": b'vm\t"1"\\',
+    "/local/domain/1/data": b"",
+    "/local/domain/1/data/set_clipboard": b"secret",
+    "/local/domain/1/data/report_clipboard": b"secret",
+    "/local/domain/1/data/updated": b"\x01\xff",
+    "/vm": b"",
+}
+
+
+class XenstoredStandIn(UnixStandIn):
+    """Minimal xenstored answering DIRECTORY and READ requests for TREE"""
+
+    def __init__(self, path):
+        UnixStandIn.__init__(self, path)
+        self.reads = []
+        self.batches = []
+
+    def serve(self, conn):
+        """Reply to the batches of requests of one connection"""
+        buf = b""
+        while True:
+            data = conn.recv(65536)
+            if not data:
+                return
+            buf += data
+            replies = []
+            while len(buf) >= HEADER.size:
+                msg_type, req_id, tx_id, size = HEADER.unpack(buf[:HEADER.size])
+                if len(buf) < HEADER.size + size:
+                    break
+                path = buf[HEADER.size:HEADER.size + size].rstrip(b"\0").decode()
+                buf = buf[HEADER.size + size:]
+                reply_type, payload = self.reply(msg_type, path)
+                replies.append(HEADER.pack(reply_type, req_id, tx_id, len(payload)) + payload)
+            self.batches.append(len(replies))
+            conn.sendall(b"".join(replies))
+
+    def reply(self, msg_type, path):
+        """Return the type and payload of the reply to a request"""
+        if msg_type == XS_READ and path in TREE:
+            self.reads.append(path)
+            return msg_type, TREE[path]
+        if msg_type == XS_DIRECTORY and (path == "/" or path in TREE):
+            prefix = path.rstrip("/") + "/"
+            children = [p[len(prefix):] for p in TREE
+                        if p.startswith(prefix) and "/" not in p[len(prefix):]]
+            return msg_type, b"".join(child.encode() + b"\0" for child in children)
+        return XS_ERROR, b"ENOENT\0"
+
+
+@pytest.fixture
+def xenstored(bugtool, tmp_path, mocker):
+    """Provide the bugtool connected to a xenstored stand-in"""
+    mocker.patch.object(bugtool, "XENSTORED_SOCKET", str(tmp_path / "socket"))
+    server = XenstoredStandIn(str(tmp_path / "socket"))
+    server.start()
+    yield bugtool, server
+    server.server.close()
+
+
+def test_xenstore_walk(xenstored, mocker):
+    """Assert the xenstore-ls -f output, pipelined requests and the redaction"""
+
+    bugtool, server = xenstored
+    mocker.patch.object(bugtool, "unlimited_data", True)
+    data = {"cap": bugtool.CAP_XENSERVER_DATABASES, "func": bugtool.dump_xenstore}
+    output = bugtool.call_func("xenstore-ls -f", data)
+
+    assert output.getvalue().decode() == (
+        '/local = ""\n'
+        '/local/domain = ""\n'
+        '/local/domain/0 = ""\n'
+        '/local/domain/0/name = "Domain-0"\n'
+        '/local/domain/1 = ""\n'
+        '/local/domain/1/name = "vm\\t"1"\\\\"\n'
+        '/local/domain/1/data = ""\n'
+        "/local/domain/1/data/set_clipboard = <filtered for security>\n"
+        "/local/domain/1/data/report_clipboard = <filtered for security>\n"
+        '/local/domain/1/data/updated = "\\001\\xff"\n'
+        '/vm = ""\n'
+    )
+    # The clipboards are not even read, and requests of siblings are sent together:
+    assert not [path for path in server.reads if "clipboard" in path]
+    assert server.batches == [1, 4, 2, 4, 2, 4, 4]
+
+
+def test_xenstore_fallback(bugtool, tmp_path, mocker):
+    """Assert that xenstore-ls runs (filtered) when xenstored cannot be reached"""
+
+    mocker.patch.object(bugtool, "XENSTORED_SOCKET", str(tmp_path / "socket"))
+    script = tmp_path / "xenstore-ls"
+    script.write_text("#!/bin/sh\necho /local/domain/2/data/set_clipboard = secret\n")
+    os.chmod(str(script), 0o755)
+    mocker.patch.object(bugtool, "XENSTORE_LS", str(script))
+
+    assert b"".join(bugtool.dump_xenstore(bugtool.CAP_XENSERVER_DATABASES)) == (
+        b"/local/domain/2/data/set_clipboard = <filtered for security>\n"
+    )
+
+
+def test_xenstore_walk_missing_replies(bugtool):
+    """Assert that paths without replies are listed like failed requests"""
+
+    class ShortClient:
+        """Client which only replies to the requests for the first path"""
+
+        def request_all(self, requests):
+            """Return the replies to the READ and DIRECTORY requests of the first path"""
+            return [(XS_READ, b"1"), (XS_DIRECTORY, b"")][:len(requests)]
+
+    lines = list(bugtool.xenstore_walk(ShortClient(), "/", ["local", "vm"]))
+    assert lines == [b'/local = "1"\n', b"/vm:\n"]